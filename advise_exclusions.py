@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+
+from __future__ import annotations
+
+import argparse
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from lib.duplicacy_repository_validator import DuplicacyRepositoryValidator
+from lib.exclusion_advisor import (
+    DuplicacyFiltersMerger,
+    ExclusionAdvice,
+    ExclusionAdvisor,
+)
+from run_backup import format_size
+
+
+def advise() -> None:
+    parser = argparse.ArgumentParser(
+        description="Suggest duplicacy filters for regenerable and high-churn directories"
+    )
+    parser.add_argument(
+        "--repository-path",
+        help="Path where the duplicacy repository is initialized",
+        required=True,
+    )
+    parser.add_argument(
+        "--churn-days",
+        help="Files modified within this many days count as churned",
+        type=int,
+        default=7,
+    )
+    parser.add_argument(
+        "--churn-ratio",
+        help="Suggest directories where at least this fraction of bytes churned",
+        type=float,
+        default=0.5,
+    )
+    parser.add_argument(
+        "--churn-min-megabytes",
+        help="Only suggest high-churn directories at least this large",
+        type=int,
+        default=100,
+    )
+    parser.add_argument(
+        "--include-churn",
+        help="Also write high-churn directories to the filters, not only regenerable ones",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of directories scanned in parallel",
+        type=int,
+        default=min(32, (os.cpu_count() or 1) * 4),
+    )
+    parser.add_argument(
+        "--write",
+        help="Merge the suggested exclusions into .duplicacy/filters",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    repository_path = Path(args.repository_path)
+    DuplicacyRepositoryValidator().validate(
+        specified_path=repository_path,
+    )
+
+    print(f"Scanning {repository_path}")
+    advice = ExclusionAdvisor(
+        repository_path=repository_path,
+        churn_window_seconds=timedelta(days=args.churn_days).total_seconds(),
+        churn_ratio_threshold=args.churn_ratio,
+        churn_min_bytes=args.churn_min_megabytes * 1024**2,
+        workers=args.workers,
+    ).advise()
+    print_advice(advice=advice)
+
+    candidates = [
+        candidate
+        for candidate in advice.candidates
+        if args.include_churn or candidate.regenerable
+    ]
+    if not args.write:
+        print("\nSuggested filters, use --write to merge them into .duplicacy/filters:")
+        for candidate in candidates:
+            print(f"  {candidate.filter_pattern}")
+        return
+
+    DuplicacyFiltersMerger().merge(
+        filters_path=repository_path.joinpath(".duplicacy", "filters"),
+        candidates=candidates,
+    )
+
+
+def print_advice(advice: ExclusionAdvice) -> None:
+    total = advice.total
+    print(
+        f"\nRepository: {total.files} files, {format_size(total.bytes)}, {format_size(total.churned_bytes)} churned, scanned in {total.scan_seconds:.1f}s of work"
+    )
+    if len(advice.candidates) == 0:
+        print("No exclusions to suggest")
+        return
+
+    print("\nExclusion candidates:")
+    saved_bytes = 0
+    saved_churned_bytes = 0
+    saved_seconds = 0.0
+    for candidate in advice.candidates:
+        usage = candidate.usage
+        saved_bytes += usage.bytes
+        saved_churned_bytes += usage.churned_bytes
+        saved_seconds += usage.scan_seconds
+        print(
+            f"  {candidate.path}: {format_size(usage.bytes)}, {format_size(usage.churned_bytes)} churned, {usage.files} files, ~{usage.scan_seconds:.1f}s scan ({candidate.reason})"
+        )
+    print(
+        f"\nExcluding all candidates saves ~{format_size(saved_bytes)} of backup set, ~{format_size(saved_churned_bytes)} of upload per churn window and ~{saved_seconds / max(total.scan_seconds, 1e-9):.0%} of scan time"
+    )
+
+
+if __name__ == "__main__":
+    advise()
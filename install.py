@@ -16,6 +16,7 @@ from lib.deployables_installer import DeployablesInstaller
 from lib.deployement_path_resolver import DeploymentPathResolver
 from lib.duplicacy_executable_finder import DuplicacyExecutableFinder
 from lib.duplicacy_repository_validator import DuplicacyRepositoryValidator
+from lib.hooks_configuration_validator import HooksConfigurationValidator
 from lib.launchd import Launchd
 from lib.launchd_plist_factory import LaunchdPlistFactory
 from lib.start_calendar_interval import StartCalendarInterval
@@ -40,6 +41,11 @@ default_binary_deployment_path = Path(
     f"/Library/Application Support/{service_identifier}"
 )
 
+supervisor_socket_path = Path(f"/var/run/{service_identifier}.sock")
+hooks_deployment_path = default_binary_deployment_path.joinpath(
+    service_identifier + ".hooks.json"
+)
+
 launchctl_path = Path("/bin/launchctl")
 
 
@@ -102,6 +108,113 @@ def install() -> None:
         "--healthcheck-check-url",
         help="healthchecks.io URL to ping on check completion",
     )
+    parser.add_argument(
+        "--log-shipping-url",
+        help="HTTP collector URL to ship run logs and backup stats to in compressed batches",
+    )
+    parser.add_argument(
+        "--log-shipping-batch-bytes",
+        help="Maximum size of uncompressed log lines in a single shipped batch",
+        type=int,
+    )
+    parser.add_argument(
+        "--log-shipping-flush-interval",
+        help="Seconds between log shipping flushes while a run is in progress",
+        type=int,
+    )
+    parser.add_argument(
+        "--log-shipping-max-bytes-per-second",
+        help="Bandwidth cap for log shipping",
+        type=int,
+    )
+    parser.add_argument(
+        "--supervisor",
+        help="Keep a resident supervisor process that schedules runs itself and accepts control commands over a Unix socket",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--probe-storage",
+        help="Measure storage latency and throughput before the backup and skip the run if the storage is unreachable",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--storage-mirror",
+        help="Name of a storage in the repository preferences to choose from. The fastest reachable mirror is used for the run. Implies --probe-storage",
+        action="extend",
+        nargs="+",
+        type=str,
+        default=[],
+    )
+    parser.add_argument(
+        "--verify-sample-megabytes",
+        help="Restore a sample of files up to this size from the latest revision after check and compare them against the live files",
+        type=int,
+    )
+    parser.add_argument(
+        "--verify-time-budget-minutes",
+        help="Stop restoring verification samples after this many minutes",
+        type=int,
+    )
+    parser.add_argument(
+        "--verify-coverage-days",
+        help="Prioritize files that haven't been verified within this many days",
+        type=int,
+    )
+    parser.add_argument(
+        "--healthcheck-verify-url",
+        help="healthchecks.io URL to ping on verification completion",
+    )
+    parser.add_argument(
+        "--cache-max-megabytes",
+        help="Evict least recently used chunks from the duplicacy cache in .duplicacy/cache down to this size after each phase",
+        type=int,
+    )
+    parser.add_argument(
+        "--json-log",
+        help="Also write duplicacy.jsonl with one JSON event per log line, tagged with the run id and phase",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--hooks",
+        help="JSON file with before_backup and after_backup hooks to run around the backup",
+    )
+    parser.add_argument(
+        "--growth-report-top",
+        help="After each backup, report this many directories that grew the most since the previous revision",
+        type=int,
+    )
+    parser.add_argument(
+        "--growth-report-depth",
+        help="Number of path components that directories in the growth report are grouped by",
+        type=int,
+    )
+    parser.add_argument(
+        "--restore-drill-megabytes",
+        help="Periodically restore a random sample of this many megabytes from the latest revision to measure recovery",
+        type=int,
+    )
+    parser.add_argument(
+        "--restore-drill-path",
+        help="Restore everything under this repository path in the restore drill instead of a random sample. Can be repeated",
+        action="extend",
+        nargs="+",
+        type=str,
+        default=[],
+    )
+    parser.add_argument(
+        "--restore-drill-threads",
+        help="Number of download threads of the restore drill",
+        type=int,
+    )
+    parser.add_argument(
+        "--restore-drill-interval-days",
+        help="Minimum number of days between restore drills",
+        type=int,
+    )
+    parser.add_argument(
+        "--healthcheck-restore-drill-url",
+        help="URL to ping with restore drill results",
+    )
     args = parser.parse_args()
 
     root = "root"
@@ -120,6 +233,10 @@ def install() -> None:
     DuplicacyRepositoryValidator().validate(
         specified_path=Path(args.repository_path),
     )
+    if args.hooks is not None:
+        HooksConfigurationValidator().validate(
+            specified_path=Path(args.hooks),
+        )
 
     installer = DeployablesInstaller()
     installer.deploy(
@@ -171,6 +288,32 @@ def install() -> None:
                         calendar_intervals=intervals,
                         skip_display_alert=args.skip_display_alert,
                         skip_check_for_full_disk_access=args.skip_check_for_full_disk_access,
+                        log_shipping_url=args.log_shipping_url,
+                        log_shipping_batch_bytes=args.log_shipping_batch_bytes,
+                        log_shipping_flush_interval=args.log_shipping_flush_interval,
+                        log_shipping_max_bytes_per_second=args.log_shipping_max_bytes_per_second,
+                        supervisor_socket_path=supervisor_socket_path
+                        if args.supervisor
+                        else None,
+                        probe_storage=args.probe_storage
+                        or len(args.storage_mirror) > 0,
+                        storage_mirrors=args.storage_mirror,
+                        healthcheck_verify_url=args.healthcheck_verify_url,
+                        verify_sample_megabytes=args.verify_sample_megabytes,
+                        verify_time_budget_minutes=args.verify_time_budget_minutes,
+                        verify_coverage_days=args.verify_coverage_days,
+                        cache_max_megabytes=args.cache_max_megabytes,
+                        json_log=args.json_log,
+                        hooks_path=hooks_deployment_path
+                        if args.hooks is not None
+                        else None,
+                        growth_report_top=args.growth_report_top,
+                        growth_report_depth=args.growth_report_depth,
+                        restore_drill_megabytes=args.restore_drill_megabytes,
+                        restore_drill_paths=args.restore_drill_path,
+                        restore_drill_threads=args.restore_drill_threads,
+                        restore_drill_interval_days=args.restore_drill_interval_days,
+                        healthcheck_restore_drill_url=args.healthcheck_restore_drill_url,
                     ).plist_string(),
                     description="service plist",
                     destination=service_plist_deployment_path,
@@ -207,6 +350,21 @@ def install() -> None:
             ),
         ]
     )
+    if args.hooks is not None:
+        # Hooks run as root, so only root may change them
+        installer.deploy(
+            deployables=[
+                Deployable(
+                    deploy=deploy_by_copying(
+                        source=Path(args.hooks),
+                        destination=hooks_deployment_path,
+                    ),
+                    user=root,
+                    group=wheel,
+                    mode=0o600,
+                ),
+            ]
+        )
 
     launchd = Launchd(
         launchctl_path=launchctl_path,
@@ -232,9 +390,14 @@ def install() -> None:
         )
         subprocess.run(args=["/usr/bin/open", "-R", backup_binary_deployment_path])
 
-    print(
-        f"\nTry:\n\n sudo launchctl kickstart system/{service_identifier}\n\nto begin backup\n"
-    )
+    if args.supervisor:
+        print(
+            f'\nTry:\n\n sudo /usr/bin/python3 "{backup_script_deployment_path}" run\n\nto begin backup. Use status, cancel, pause and resume to control the supervisor\n'
+        )
+    else:
+        print(
+            f"\nTry:\n\n sudo launchctl kickstart system/{service_identifier}\n\nto begin backup\n"
+        )
     print(f'Logs can be found in:\n\n open -R "{logging_directory}"\n')
 
 
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Regenerable directories by name. Markers are sibling files that must exist for
+# generic names like "build" to be treated as build outputs
+regenerable_directory_markers: Dict[str, Optional[List[str]]] = {
+    "node_modules": None,
+    "bower_components": None,
+    ".gradle": None,
+    "DerivedData": None,
+    "__pycache__": None,
+    ".pytest_cache": None,
+    ".mypy_cache": None,
+    ".tox": None,
+    ".venv": None,
+    ".cache": None,
+    "Caches": None,
+    ".Trash": None,
+    ".vagrant": None,
+    "com.docker.docker": None,
+    "venv": ["pyvenv.cfg"],
+    "build": [
+        "build.gradle",
+        "build.gradle.kts",
+        "CMakeLists.txt",
+        "setup.py",
+        "pyproject.toml",
+        "package.json",
+    ],
+    "target": ["Cargo.toml", "pom.xml"],
+    "dist": ["package.json", "setup.py", "pyproject.toml"],
+}
+
+
+@dataclass
+class DirectoryUsage:
+    files: int = 0
+    bytes: int = 0
+    churned_bytes: int = 0
+    scan_seconds: float = 0.0
+
+    def add(self, other: DirectoryUsage) -> None:
+        self.files += other.files
+        self.bytes += other.bytes
+        self.churned_bytes += other.churned_bytes
+        self.scan_seconds += other.scan_seconds
+
+    @property
+    def churn_ratio(self) -> float:
+        if self.bytes == 0:
+            return 0.0
+        return self.churned_bytes / self.bytes
+
+
+@dataclass
+class ExclusionCandidate:
+    path: Path
+    reason: str
+    usage: DirectoryUsage
+    regenerable: bool
+
+    @property
+    def filter_pattern(self) -> str:
+        return f"-{self.path.as_posix()}/"
+
+
+@dataclass
+class ExclusionAdvice:
+    total: DirectoryUsage
+    candidates: List[ExclusionCandidate] = field(default_factory=list)
+
+
+@dataclass
+class DirectoryScan:
+    path: Path
+    # Usage of the files directly in the directory
+    usage: DirectoryUsage
+    subdirectories: List[Path]
+    regenerable_reasons: Dict[Path, str]
+
+
+@dataclass
+class ExclusionAdvisor:
+    repository_path: Path
+    churn_window_seconds: float
+    churn_ratio_threshold: float
+    churn_min_bytes: int
+    workers: int
+
+    def __post_init__(self) -> None:
+        self.__churned_since = 0.0
+        self.__pattern_candidates: List[ExclusionCandidate] = []
+        self.__churn_candidates: List[ExclusionCandidate] = []
+
+    def advise(self) -> ExclusionAdvice:
+        self.__churned_since = time.time() - self.churn_window_seconds
+        self.__pattern_candidates = []
+        self.__churn_candidates = []
+
+        scans = self.__scan_repository()
+        # Deeper directories go first, so each directory adds up its finished subdirectories
+        usages: Dict[Path, DirectoryUsage] = dict()
+        for path in sorted(scans, key=lambda path: len(path.parts), reverse=True):
+            scan = scans.pop(path)
+            usage = scan.usage
+            for subdirectory in scan.subdirectories:
+                subdirectory_usage = usages.pop(subdirectory)
+                usage.add(subdirectory_usage)
+                reason = scan.regenerable_reasons.get(subdirectory)
+                if reason is not None:
+                    self.__record(
+                        candidates=self.__pattern_candidates,
+                        candidate=ExclusionCandidate(
+                            path=subdirectory,
+                            reason=reason,
+                            usage=subdirectory_usage,
+                            regenerable=True,
+                        ),
+                    )
+            usages[path] = usage
+
+            if (
+                len(path.parts) > 0
+                and usage.bytes >= self.churn_min_bytes
+                and usage.churn_ratio >= self.churn_ratio_threshold
+            ):
+                self.__record(
+                    candidates=self.__churn_candidates,
+                    candidate=ExclusionCandidate(
+                        path=path,
+                        reason=f"{usage.churn_ratio:.0%} of bytes changed recently",
+                        usage=usage,
+                        regenerable=False,
+                    ),
+                )
+
+        return ExclusionAdvice(
+            total=usages[Path(".")],
+            candidates=sorted(
+                self.__pattern_candidates + self.__without_nested(),
+                key=lambda candidate: candidate.usage.bytes,
+                reverse=True,
+            ),
+        )
+
+    def __scan_repository(self) -> Dict[Path, DirectoryScan]:
+        scans: Dict[Path, DirectoryScan] = dict()
+        # Every directory is a separate task, so a single large subtree is still scanned in parallel
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {executor.submit(self.__scan_directory, Path("."))}
+            while len(pending) > 0:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    scan = future.result()
+                    scans[scan.path] = scan
+                    pending |= {
+                        executor.submit(self.__scan_directory, subdirectory)
+                        for subdirectory in scan.subdirectories
+                    }
+        return scans
+
+    def __scan_directory(self, relative_path: Path) -> DirectoryScan:
+        started_at = time.monotonic()
+        usage = DirectoryUsage()
+        subdirectories: List[Path] = []
+        sibling_names: List[str] = []
+        try:
+            with os.scandir(self.repository_path.joinpath(relative_path)) as entries:
+                for entry in entries:
+                    if len(relative_path.parts) == 0 and entry.name == ".duplicacy":
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(relative_path.joinpath(entry.name))
+                    elif entry.is_file(follow_symlinks=False):
+                        sibling_names.append(entry.name)
+                        self.__add_file(usage=usage, entry=entry)
+        except OSError as exception:
+            print(f"Warning: couldn't scan {relative_path}: {exception}")
+        usage.scan_seconds = time.monotonic() - started_at
+
+        regenerable_reasons: Dict[Path, str] = dict()
+        for subdirectory in subdirectories:
+            reason = self.__regenerable_reason(
+                name=subdirectory.name,
+                sibling_names=sibling_names,
+            )
+            if reason is not None:
+                regenerable_reasons[subdirectory] = reason
+        return DirectoryScan(
+            path=relative_path,
+            usage=usage,
+            subdirectories=subdirectories,
+            regenerable_reasons=regenerable_reasons,
+        )
+
+    def __add_file(self, usage: DirectoryUsage, entry: os.DirEntry[str]) -> None:
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            return
+        usage.files += 1
+        usage.bytes += stat.st_size
+        if stat.st_mtime >= self.__churned_since:
+            usage.churned_bytes += stat.st_size
+
+    def __regenerable_reason(
+        self,
+        name: str,
+        sibling_names: List[str],
+    ) -> Optional[str]:
+        if name not in regenerable_directory_markers:
+            return None
+        markers = regenerable_directory_markers[name]
+        if markers is None:
+            return f"regenerable {name}"
+        for marker in markers:
+            if marker in sibling_names:
+                return f"regenerable {name} next to {marker}"
+        return None
+
+    def __record(
+        self,
+        candidates: List[ExclusionCandidate],
+        candidate: ExclusionCandidate,
+    ) -> None:
+        # Subdirectories are recorded first, so a regenerable parent replaces its children
+        candidates[:] = [
+            existing
+            for existing in candidates
+            if candidate.path not in existing.path.parents
+        ]
+        candidates.append(candidate)
+
+    def __without_nested(self) -> List[ExclusionCandidate]:
+        pattern_paths = [candidate.path for candidate in self.__pattern_candidates]
+        return [
+            candidate
+            for candidate in self.__churn_candidates
+            if not any(
+                path == candidate.path
+                or path in candidate.path.parents
+                or candidate.path in path.parents
+                for path in pattern_paths
+            )
+        ]
+
+
+class DuplicacyFiltersMerger:
+    def merge(
+        self,
+        filters_path: Path,
+        candidates: List[ExclusionCandidate],
+    ) -> List[str]:
+        existing_lines: List[str] = []
+        if filters_path.exists():
+            with open(filters_path, "r") as filters_file:
+                existing_lines = filters_file.read().splitlines()
+
+        added_lines = [
+            candidate.filter_pattern
+            for candidate in candidates
+            if candidate.filter_pattern not in existing_lines
+        ]
+        if len(added_lines) == 0:
+            print(f"{filters_path} already contains all suggested exclusions")
+            return added_lines
+
+        # duplicacy uses the first matching pattern, and with only include patterns
+        # everything unmatched is excluded. An added exclusion would change both
+        if any(self.__is_include_pattern(line) for line in existing_lines):
+            print(
+                f"{filters_path} has include patterns, so exclusions can't be merged safely. Add them where they belong:"
+            )
+            for line in added_lines:
+                print(f"  {line}")
+            return []
+
+        first_pattern_index = next(
+            (
+                index
+                for index, line in enumerate(existing_lines)
+                if len(line.strip()) > 0 and not line.startswith("#")
+            ),
+            len(existing_lines),
+        )
+        print(f"Writing {len(added_lines)} exclusions to {filters_path}")
+        with open(filters_path, "w") as filters_file:
+            filters_file.write(
+                "\n".join(
+                    existing_lines[:first_pattern_index]
+                    + ["# Added by advise_exclusions.py"]
+                    + added_lines
+                    + existing_lines[first_pattern_index:]
+                )
+                + "\n"
+            )
+        return added_lines
+
+    def __is_include_pattern(self, line: str) -> bool:
+        return line.startswith("+") or line.startswith("i:")
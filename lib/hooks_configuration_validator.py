@@ -0,0 +1,15 @@
+from pathlib import Path
+
+import run_backup
+
+
+class HooksConfigurationValidator:
+    def validate(self, specified_path: Path) -> None:
+        for stage in run_backup.hook_stages:
+            try:
+                hooks = run_backup.read_hooks(hooks_path=specified_path, stage=stage)
+            except (OSError, ValueError, run_backup.HookConfigurationException) as e:
+                print(f"Invalid hooks configuration in {specified_path}: {e}")
+                raise
+            if len(hooks) > 0:
+                print(f"Hooks {stage}: {', '.join(hook.name for hook in hooks)}")
@@ -1,7 +1,9 @@
+import json
 import plistlib
+import shlex
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 
 from lib.start_calendar_interval import StartCalendarInterval
 import run_backup
@@ -22,6 +24,27 @@ class LaunchdPlistFactory:
     calendar_intervals: List[StartCalendarInterval]
     skip_check_for_full_disk_access: bool
     skip_display_alert: bool
+    log_shipping_url: Optional[str]
+    log_shipping_batch_bytes: Optional[int]
+    log_shipping_flush_interval: Optional[int]
+    log_shipping_max_bytes_per_second: Optional[int]
+    supervisor_socket_path: Optional[Path]
+    probe_storage: bool
+    storage_mirrors: List[str]
+    healthcheck_verify_url: Optional[str]
+    verify_sample_megabytes: Optional[int]
+    verify_time_budget_minutes: Optional[int]
+    verify_coverage_days: Optional[int]
+    cache_max_megabytes: Optional[int]
+    json_log: bool
+    hooks_path: Optional[Path]
+    growth_report_top: Optional[int]
+    growth_report_depth: Optional[int]
+    restore_drill_megabytes: Optional[int]
+    restore_drill_paths: List[str]
+    restore_drill_threads: Optional[int]
+    restore_drill_interval_days: Optional[int]
+    healthcheck_restore_drill_url: Optional[str]
 
     def plist_string(self) -> str:
         environment_variables = dict()
@@ -47,6 +70,82 @@ class LaunchdPlistFactory:
             ] = "1"
         if self.skip_display_alert:
             environment_variables[run_backup.skip_display_alert_env.name] = "1"
+        if self.log_shipping_url is not None:
+            environment_variables[
+                run_backup.log_shipping_url_env.name
+            ] = self.log_shipping_url
+        if self.log_shipping_batch_bytes is not None:
+            environment_variables[run_backup.log_shipping_batch_bytes_env.name] = str(
+                self.log_shipping_batch_bytes
+            )
+        if self.log_shipping_flush_interval is not None:
+            environment_variables[
+                run_backup.log_shipping_flush_interval_env.name
+            ] = str(self.log_shipping_flush_interval)
+        if self.log_shipping_max_bytes_per_second is not None:
+            environment_variables[
+                run_backup.log_shipping_max_bytes_per_second_env.name
+            ] = str(self.log_shipping_max_bytes_per_second)
+        if self.probe_storage:
+            environment_variables[run_backup.probe_storage_env.name] = "1"
+        if len(self.storage_mirrors) > 0:
+            environment_variables[run_backup.storage_mirrors_env.name] = " ".join(
+                self.storage_mirrors
+            )
+        if self.healthcheck_verify_url is not None:
+            environment_variables[
+                run_backup.healthcheck_verify_url_env.name
+            ] = self.healthcheck_verify_url
+        if self.verify_sample_megabytes is not None:
+            environment_variables[run_backup.verify_sample_bytes_env.name] = str(
+                self.verify_sample_megabytes * 1024**2
+            )
+        if self.verify_time_budget_minutes is not None:
+            environment_variables[run_backup.verify_time_budget_env.name] = str(
+                self.verify_time_budget_minutes * 60
+            )
+        if self.verify_coverage_days is not None:
+            environment_variables[run_backup.verify_coverage_days_env.name] = str(
+                self.verify_coverage_days
+            )
+        if self.cache_max_megabytes is not None:
+            environment_variables[run_backup.cache_max_bytes_env.name] = str(
+                self.cache_max_megabytes * 1024**2
+            )
+        if self.json_log:
+            environment_variables[
+                run_backup.log_format_env.name
+            ] = run_backup.json_log_format
+        if self.hooks_path is not None:
+            environment_variables[run_backup.hooks_path_env.name] = str(self.hooks_path)
+        if self.growth_report_top is not None:
+            environment_variables[run_backup.growth_report_top_env.name] = str(
+                self.growth_report_top
+            )
+        if self.growth_report_depth is not None:
+            environment_variables[run_backup.growth_report_depth_env.name] = str(
+                self.growth_report_depth
+            )
+        if self.restore_drill_megabytes is not None:
+            environment_variables[run_backup.restore_drill_bytes_env.name] = str(
+                self.restore_drill_megabytes * 1024**2
+            )
+        if len(self.restore_drill_paths) > 0:
+            environment_variables[run_backup.restore_drill_paths_env.name] = shlex.join(
+                self.restore_drill_paths
+            )
+        if self.restore_drill_threads is not None:
+            environment_variables[run_backup.restore_drill_threads_env.name] = str(
+                self.restore_drill_threads
+            )
+        if self.restore_drill_interval_days is not None:
+            environment_variables[
+                run_backup.restore_drill_interval_days_env.name
+            ] = str(self.restore_drill_interval_days)
+        if self.healthcheck_restore_drill_url is not None:
+            environment_variables[
+                run_backup.healthcheck_restore_drill_url_env.name
+            ] = self.healthcheck_restore_drill_url
 
         environment_variables["BACKUP_SCRIPT_PATH"] = str(self.backup_script_path)
         environment_variables[run_backup.log_path_env.name] = str(
@@ -56,27 +155,15 @@ class LaunchdPlistFactory:
             self.duplicacy_path
         )
 
-        intervals = list()
-        for interval in self.calendar_intervals:
-            output = dict()
-            if interval.minute is not None:
-                output["Minute"] = interval.minute
-            if interval.hour is not None:
-                output["Hour"] = interval.hour
-            if interval.day is not None:
-                output["Day"] = interval.day
-            if interval.weekday is not None:
-                output["Weekday"] = interval.weekday
-            if interval.month is not None:
-                output["Month"] = interval.month
-            intervals.append(output)
+        intervals = [interval.plist_dict() for interval in self.calendar_intervals]
 
-        launchd_plist = {
+        launchd_plist: Dict[str, Any] = {
             "Label": self.service_identifier,
             "Program": str(self.backup_binary_deployment_path),
             "EnvironmentVariables": environment_variables,
             "WorkingDirectory": str(self.repository_path),
-            "StartCalendarInterval": intervals,
+            # Leaves time to stop duplicacy and report the cancelled run after SIGTERM
+            "ExitTimeOut": run_backup.termination_grace_period + 10,
             "StandardOutPath": str(
                 self.logging_directory.joinpath("backup.stdout.log")
             ),
@@ -85,4 +172,17 @@ class LaunchdPlistFactory:
             ),
         }
 
+        if self.supervisor_socket_path is not None:
+            # The supervisor stays resident and schedules runs by itself
+            environment_variables[run_backup.supervisor_socket_path_env.name] = str(
+                self.supervisor_socket_path
+            )
+            environment_variables[
+                run_backup.start_calendar_intervals_env.name
+            ] = json.dumps(intervals)
+            launchd_plist["RunAtLoad"] = True
+            launchd_plist["KeepAlive"] = True
+        else:
+            launchd_plist["StartCalendarInterval"] = intervals
+
         return plistlib.dumps(launchd_plist).decode()
@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import ast
+import bisect
+import gzip
+import math
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+from pathlib import Path
+from random import Random
+from typing import Callable, Dict, List, Optional, TextIO
+
+import run_backup
+from lib.start_calendar_interval import StartCalendarInterval
+
+DurationSampler = Callable[[Random], float]
+
+
+class ScheduleSimulatorException(Exception):
+    pass
+
+
+def empirical_sampler(samples: List[float]) -> DurationSampler:
+    def sample(random: Random) -> float:
+        return random.choice(samples)
+
+    return sample
+
+
+def lognormal_sampler(mean: float, stddev: float) -> DurationSampler:
+    if mean <= 0:
+        print(f"Mean duration must be positive, got {mean}")
+        raise ScheduleSimulatorException()
+
+    sigma = math.sqrt(math.log(1 + (stddev / mean) ** 2))
+    mu = math.log(mean) - sigma**2 / 2
+
+    def sample(random: Random) -> float:
+        return random.lognormvariate(mu, sigma)
+
+    return sample
+
+
+class HistoricalDurationsParser:
+    # Matches the format set up by run_backup.create_rotating_logger
+    __line_pattern = re.compile(
+        r"^\[(?P<timestamp>[^\]]+)\] \w+ \[[^\]]*\] (?P<message>.*)$"
+    )
+    __timestamp_format = "%d/%b/%Y %H:%M:%S"
+    __start_pattern = re.compile(r"^(?P<action>\w[\w -]*) started$")
+    __end_pattern = re.compile(
+        r"^(?:(?P<action>\w[\w -]*) (?P<result>was successful|was cancelled|failed with exit code: -?\d+)"
+        r"|Error in (?P<failed_action>\w[\w -]*?):)"
+    )
+    # Logs written before phases logged their start only mark the start of their subprocess
+    __subprocess_start_prefix = "Running subprocess: "
+
+    def parse(self, log_directory: Path) -> Dict[str, List[float]]:
+        log_paths = sorted(log_directory.glob("duplicacy.log*"))
+        if len(log_paths) == 0:
+            print(f"Couldn't find any duplicacy logs in {log_directory}")
+            raise ScheduleSimulatorException()
+
+        durations: Dict[str, List[float]] = dict()
+        for log_path in log_paths:
+            with self.__open(log_path) as log_file:
+                self.__parse_file(log_file=log_file, durations=durations)
+        return durations
+
+    def __open(self, log_path: Path) -> TextIO:
+        if log_path.name.endswith(".gz"):
+            return gzip.open(log_path, "rt", errors="replace")
+        return open(log_path, "r", errors="replace")
+
+    def __parse_file(
+        self,
+        log_file: TextIO,
+        durations: Dict[str, List[float]],
+    ) -> None:
+        started_at: Dict[str, datetime] = dict()
+        subprocess_started_at: Dict[str, datetime] = dict()
+        for line in log_file:
+            match = self.__line_pattern.match(line.rstrip("\n"))
+            if match is None:
+                continue
+            message = match.group("message")
+            timestamp = self.__parse_timestamp(match.group("timestamp"))
+            if timestamp is None:
+                continue
+
+            start_match = self.__start_pattern.match(message)
+            if start_match is not None:
+                started_at[start_match.group("action").lower()] = timestamp
+                continue
+            if message.startswith(self.__subprocess_start_prefix):
+                subprocess = self.__phase_from_arguments(
+                    message[len(self.__subprocess_start_prefix) :]
+                )
+                if subprocess is not None:
+                    subprocess_started_at[subprocess] = timestamp
+                continue
+
+            end_match = self.__end_pattern.match(message)
+            if end_match is None:
+                continue
+            phase = (
+                end_match.group("action") or end_match.group("failed_action")
+            ).lower()
+            phase_started_at = started_at.pop(phase, None)
+            subprocess_phase_started_at = subprocess_started_at.pop(phase, None)
+            if phase_started_at is None:
+                phase_started_at = subprocess_phase_started_at
+            # A cancelled phase didn't run for its full duration
+            if phase_started_at is None or end_match.group("result") == "was cancelled":
+                continue
+            if timestamp >= phase_started_at:
+                durations.setdefault(phase, []).append(
+                    (timestamp - phase_started_at).total_seconds()
+                )
+
+    def __phase_from_arguments(self, value: str) -> Optional[str]:
+        try:
+            arguments = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return None
+        if not isinstance(arguments, list):
+            return None
+        # Global options like -log come before the command
+        commands = [
+            str(argument)
+            for argument in arguments[1:]
+            if not str(argument).startswith("-")
+        ]
+        if len(commands) == 0:
+            return None
+        return commands[0]
+
+    def __parse_timestamp(self, value: str) -> Optional[datetime]:
+        try:
+            return datetime.strptime(value, self.__timestamp_format)
+        except ValueError:
+            return None
+
+
+@dataclass
+class SimulatedRun:
+    queued_at: datetime
+    started_at: datetime
+    finished_at: datetime
+
+
+@dataclass
+class ScheduleSimulationReport:
+    weeks: int
+    trials: int
+    fires_per_trial: int
+    runs: int = 0
+    overlapping_fires: int = 0
+    queue_delays: List[float] = field(default_factory=list)
+    durations: List[float] = field(default_factory=list)
+    runs_followed_by_fire: int = 0
+    runs_running_at_next_fire: int = 0
+    runs_into_business_hours: int = 0
+
+    @property
+    def overlaps_per_week(self) -> float:
+        return self.overlapping_fires / (self.trials * self.weeks)
+
+    @property
+    def probability_running_at_next_fire(self) -> float:
+        if self.runs_followed_by_fire == 0:
+            return 0.0
+        return self.runs_running_at_next_fire / self.runs_followed_by_fire
+
+    @property
+    def probability_into_business_hours(self) -> float:
+        if self.runs == 0:
+            return 0.0
+        return self.runs_into_business_hours / self.runs
+
+
+@dataclass
+class ScheduleSimulator:
+    intervals: List[StartCalendarInterval]
+    phase_samplers: Dict[str, DurationSampler]
+    business_hours: range
+    business_weekdays: List[int]
+
+    def simulate(
+        self,
+        start: datetime,
+        weeks: int,
+        trials: int,
+        random: Random,
+    ) -> ScheduleSimulationReport:
+        fires = list(
+            run_backup.calendar_fire_times(
+                intervals=[interval.plist_dict() for interval in self.intervals],
+                start=start,
+                end=start + timedelta(weeks=weeks),
+            )
+        )
+        report = ScheduleSimulationReport(
+            weeks=weeks,
+            trials=trials,
+            fires_per_trial=len(fires),
+        )
+        for _ in range(trials):
+            for run in self.__simulate_trial(fires=fires, random=random, report=report):
+                self.__record_run(run=run, fires=fires, report=report)
+        return report
+
+    def __simulate_trial(
+        self,
+        fires: List[datetime],
+        random: Random,
+        report: ScheduleSimulationReport,
+    ) -> List[SimulatedRun]:
+        # launchd doesn't start a second instance of a running job: fires that
+        # arrive while a run is in progress are coalesced into one pending start
+        runs: List[SimulatedRun] = []
+        pending_since: Optional[datetime] = None
+        for fire in fires:
+            if pending_since is not None and runs[-1].finished_at <= fire:
+                runs.append(
+                    self.__run(
+                        queued_at=pending_since,
+                        started_at=runs[-1].finished_at,
+                        random=random,
+                    )
+                )
+                pending_since = None
+            if len(runs) > 0 and runs[-1].finished_at > fire:
+                report.overlapping_fires += 1
+                if pending_since is None:
+                    pending_since = fire
+                continue
+            runs.append(self.__run(queued_at=fire, started_at=fire, random=random))
+        if pending_since is not None:
+            runs.append(
+                self.__run(
+                    queued_at=pending_since,
+                    started_at=runs[-1].finished_at,
+                    random=random,
+                )
+            )
+        return runs
+
+    def __run(
+        self,
+        queued_at: datetime,
+        started_at: datetime,
+        random: Random,
+    ) -> SimulatedRun:
+        duration = sum(sample(random) for sample in self.phase_samplers.values())
+        return SimulatedRun(
+            queued_at=queued_at,
+            started_at=started_at,
+            finished_at=started_at + timedelta(seconds=duration),
+        )
+
+    def __record_run(
+        self,
+        run: SimulatedRun,
+        fires: List[datetime],
+        report: ScheduleSimulationReport,
+    ) -> None:
+        report.runs += 1
+        report.durations.append((run.finished_at - run.started_at).total_seconds())
+        queue_delay = (run.started_at - run.queued_at).total_seconds()
+        if queue_delay > 0:
+            report.queue_delays.append(queue_delay)
+
+        next_fire_index = bisect.bisect_right(fires, run.started_at)
+        if next_fire_index < len(fires):
+            report.runs_followed_by_fire += 1
+            if run.finished_at > fires[next_fire_index]:
+                report.runs_running_at_next_fire += 1
+
+        if self.__intersects_business_hours(run):
+            report.runs_into_business_hours += 1
+
+    def __intersects_business_hours(self, run: SimulatedRun) -> bool:
+        day = run.started_at.date()
+        while datetime.combine(day, time()) < run.finished_at:
+            if day.isoweekday() % 7 in self.business_weekdays:
+                midnight = datetime.combine(day, time())
+                window_start = midnight + timedelta(hours=self.business_hours.start)
+                window_end = midnight + timedelta(hours=self.business_hours.stop)
+                if run.started_at < window_end and run.finished_at > window_start:
+                    return True
+            day += timedelta(days=1)
+        return False
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import csv
 from dataclasses import dataclass
-from typing import Optional, Any
+from typing import Optional, Any, Dict
 
 
 class StartCalendarIntervalException(Exception):
@@ -34,6 +34,20 @@ class StartCalendarInterval:
             month=StartCalendarInterval.convert(interval[4], range(1, 13), "month"),
         )
 
+    def plist_dict(self) -> Dict[str, int]:
+        output = dict()
+        if self.minute is not None:
+            output["Minute"] = self.minute
+        if self.hour is not None:
+            output["Hour"] = self.hour
+        if self.day is not None:
+            output["Day"] = self.day
+        if self.weekday is not None:
+            output["Weekday"] = self.weekday
+        if self.month is not None:
+            output["Month"] = self.month
+        return output
+
     @staticmethod
     def convert(value: str, valid_range: range, title: str) -> Optional[int]:
         if is_empty(value):
@@ -1,21 +1,41 @@
 #!/usr/bin/python3
 from __future__ import annotations
 
+import argparse
+import contextlib
 import gzip
+import hashlib
+import heapq
+import json
 import logging
+import math
 import os
+import random
+import re
 import selectors
 import shlex
+import signal
 import shutil
+import socket
+import socketserver
+import sqlite3
 import subprocess
+import sys
+import tempfile
+import threading
+import time
 import typing
-from dataclasses import dataclass
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 from logging import Logger
 from logging.handlers import TimedRotatingFileHandler
 from pathlib import Path
 from selectors import PollSelector
-from typing import Union, List, Callable, Optional
-from urllib.request import urlopen
+from typing import Union, List, Callable, Optional, Dict, Iterator
+from urllib.parse import urlsplit
+from urllib.request import urlopen, Request
 import itertools
 
 
@@ -40,16 +60,82 @@ healthcheck_check_url_env = Env("HEALTHCHECK_CHECK_URL")
 healthcheck_connection_timeout = 60
 
 log_path_env = Env("LOG_PATH")
+log_format_env = Env("LOG_FORMAT")
+json_log_format = "json"
+
+log_shipping_url_env = Env("LOG_SHIPPING_URL")
+log_shipping_batch_bytes_env = Env("LOG_SHIPPING_BATCH_BYTES")
+log_shipping_flush_interval_env = Env("LOG_SHIPPING_FLUSH_INTERVAL")
+log_shipping_max_bytes_per_second_env = Env("LOG_SHIPPING_MAX_BYTES_PER_SECOND")
 
 skip_display_alert_env = Env("SKIP_DISPLAY_ALERT")
 skip_check_for_full_disk_access_env = Env("SKIP_CHECK_FOR_FULL_DISK_ACCESS")
 
+supervisor_socket_path_env = Env("SUPERVISOR_SOCKET_PATH")
+default_supervisor_socket_path = "/var/run/com.duplicacy_macos_daemon.backup.sock"
+start_calendar_intervals_env = Env("START_CALENDAR_INTERVALS")
+
+probe_storage_env = Env("PROBE_STORAGE")
+storage_mirrors_env = Env("STORAGE_MIRRORS")
+storage_probe_sample_bytes = 1024 * 1024
+storage_probe_connect_timeout = 10
+# EX_UNAVAILABLE from sysexits.h
+storage_unavailable_exit_code = 69
+
+healthcheck_verify_url_env = Env("HEALTHCHECK_VERIFY_URL")
+verify_sample_bytes_env = Env("VERIFY_SAMPLE_BYTES")
+verify_time_budget_env = Env("VERIFY_TIME_BUDGET")
+verify_coverage_days_env = Env("VERIFY_COVERAGE_DAYS")
+verify_max_files = 5000
+verify_restore_batch_size = 500
+# The time budget is checked between batches, so a batch is also bounded by its size
+verify_restore_batch_bytes = 128 * 1024**2
+
+healthcheck_restore_drill_url_env = Env("HEALTHCHECK_RESTORE_DRILL_URL")
+restore_drill_bytes_env = Env("RESTORE_DRILL_BYTES")
+restore_drill_paths_env = Env("RESTORE_DRILL_PATHS")
+restore_drill_threads_env = Env("RESTORE_DRILL_THREADS")
+restore_drill_interval_days_env = Env("RESTORE_DRILL_INTERVAL_DAYS")
+default_restore_drill_threads = 4
+default_restore_drill_interval_days = 7
+# Every file of the snapshot is matched against every restore pattern, so the drill
+# restores whole directories instead of single files to keep patterns few
+restore_drill_max_directories = 20
+restore_drill_history_length = 30
+
+cache_max_bytes_env = Env("CACHE_MAX_BYTES")
+
+growth_report_top_env = Env("GROWTH_REPORT_TOP")
+growth_report_depth_env = Env("GROWTH_REPORT_DEPTH")
+default_growth_report_depth = 2
+
+hooks_path_env = Env("HOOKS_PATH")
+hook_stages = ["before_backup", "after_backup"]
+
+# Run as part of the Backup phase, so an interruption in them resumes the backup
+backup_phase_actions = ["Pre-backup hooks", "Growth report", "Post-backup hooks"]
+
+# Has to fit into ExitTimeOut in the service plist, after which launchd sends SIGKILL
+termination_grace_period = 20
+
 
 def main() -> None:
+    if len(sys.argv) > 1:
+        control(arguments=sys.argv[1:])
+        return None
+
     logger: Logger
     log_path = Path(log_path_env.get_unwrapped()).joinpath("duplicacy.log")
+    structured_log_path: Optional[Path] = None
+    if log_format_env.get() == json_log_format:
+        structured_log_path = log_path.with_suffix(".jsonl")
+    run_context = RunContext()
     try:
-        logger = create_rotating_logger(log_path=log_path)
+        logger = create_rotating_logger(
+            log_path=log_path,
+            structured_log_path=structured_log_path,
+            run_context=run_context,
+        )
     except Exception as exception:
         print("Couldn't create a logger")
         print(exception)
@@ -58,27 +144,299 @@ def main() -> None:
         )
         exit(1)
 
+    log_shipper = LogShipper(
+        logger=logger,
+        log_path=structured_log_path or log_path,
+        url=log_shipping_url_env.get(),
+        batch_bytes=int(log_shipping_batch_bytes_env.get() or 256 * 1024),
+        flush_interval=float(log_shipping_flush_interval_env.get() or 30),
+        max_bytes_per_second=optional_int(log_shipping_max_bytes_per_second_env.get()),
+        json_lines=structured_log_path is not None,
+    )
+    log_shipper.start()
+
     commands = Commands(
         logger=logger,
         log_path=log_path,
+        run_context=run_context,
     )
-    commands.check_for_full_disk_access()
-    commands.run_backup()
-    commands.run_prune()
-    commands.run_check()
+
+    def on_termination_signal(signal_number: int, frame: typing.Any) -> None:
+        logger.warning(
+            f"Received {signal.Signals(signal_number).name}, cancelling the run"
+        )
+        commands.cancel()
+
+    signal.signal(signal.SIGTERM, on_termination_signal)
+    signal.signal(signal.SIGINT, on_termination_signal)
+
+    try:
+        supervisor_socket_path = supervisor_socket_path_env.get()
+        if supervisor_socket_path is None:
+            run_phases(commands=commands)
+        else:
+            Supervisor(
+                logger=logger,
+                commands=commands,
+                socket_path=Path(supervisor_socket_path),
+                intervals=json.loads(start_calendar_intervals_env.get() or "[]"),
+            ).serve()
+    finally:
+        log_shipper.stop()
 
     return None
 
 
+def run_phases(commands: Commands) -> None:
+    commands.begin_run()
+    commands.check_for_full_disk_access()
+    if not commands.probe_storage():
+        return
+
+    phases: List[typing.Tuple[str, Callable[[], None]]] = [
+        ("Backup", lambda: run_backup_phases(commands)),
+        ("Prune", commands.run_prune),
+        ("Check", commands.run_check),
+        ("Verification", commands.run_verification),
+        ("Restore drill", commands.run_restore_drill),
+    ]
+    interrupted_phase = commands.interrupted_phase()
+    if interrupted_phase is not None:
+        if interrupted_phase in backup_phase_actions:
+            interrupted_phase = "Backup"
+        commands.logger.info(f"Resuming the interrupted {interrupted_phase} first")
+        phases.sort(key=lambda phase: phase[0] != interrupted_phase)
+    for _, run_phase in phases:
+        run_phase()
+    commands.end_run()
+
+
+def run_backup_phases(commands: Commands) -> None:
+    commands.run_pre_backup_hooks()
+    try:
+        commands.run_backup()
+        commands.run_growth_report()
+    finally:
+        # Undoes what before_backup hooks did, even if the backup failed or was cancelled
+        commands.run_post_backup_hooks()
+
+
+@dataclass
+class WarmState:
+    # Probe results that stay valid for the lifetime of a supervisor process
+    full_disk_access_verified: bool = False
+    # Revisions don't change once created, so their listings can be kept between phases.
+    # Keyed by storage too, since every storage numbers its revisions independently
+    snapshot_listings: Dict[typing.Tuple[str, int], List[SnapshotFile]] = field(
+        default_factory=dict
+    )
+
+
+# The growth report compares the two latest revisions
+snapshot_listings_kept = 2
+
+
+@dataclass
+class RunContext:
+    run_id: Optional[str] = None
+    phase: Optional[str] = None
+
+
+@dataclass
+class RunProgress:
+    phase: Optional[str] = None
+    phase_started_at: Optional[datetime] = None
+    percent: Optional[float] = None
+    last_line: Optional[str] = None
+
+    def start_phase(self, phase: str) -> None:
+        self.phase = phase
+        self.phase_started_at = datetime.now()
+        self.percent = None
+        self.last_line = None
+
+    def on_output(self, line: str) -> None:
+        self.last_line = line.rstrip()
+        # duplicacy reports progress as "... 12.3MB/s 00:01:02 45.6%"
+        match = progress_percent_pattern.search(self.last_line)
+        if match is not None:
+            self.percent = float(match.group(1))
+
+    def as_dict(self) -> Dict[str, typing.Any]:
+        return {
+            "phase": self.phase,
+            "phase_started_at": optional_isoformat(self.phase_started_at),
+            "percent": self.percent,
+            "last_line": self.last_line,
+        }
+
+
+progress_percent_pattern = re.compile(r"(\d+(?:\.\d+)?)%$")
+
+
 @dataclass
 class Commands:
     logger: Logger
     log_path: Path
+    run_context: RunContext = field(default_factory=RunContext)
+    progress: RunProgress = field(default_factory=RunProgress)
+    warm_state: WarmState = field(default_factory=WarmState)
+
+    def __post_init__(self) -> None:
+        # Reentrant since cancel() is also called from signal handlers
+        self.__lock = threading.RLock()
+        self.__processes: List[subprocess.Popen[bytes]] = []
+        self.__paused = False
+        self.__paused_at = 0.0
+        self.__paused_seconds = 0.0
+        # Signalled when the run is resumed or cancelled
+        self.__resumed = threading.Condition(self.__lock)
+        self.__cancelled = False
+        self.__cancellation_recorded = False
+        self.__storage_arguments: List[str] = []
+        self.__pre_backup_hooks_succeeded = True
+        self.__backup_succeeded = False
+        self.__run_state_path = self.log_path.parent.joinpath("run_state.json")
+        self.__cache_manager = CacheManager(
+            logger=self.logger,
+            cache_path=Path.cwd().joinpath(".duplicacy", "cache"),
+            byte_budget=optional_int(cache_max_bytes_env.get()),
+        )
+
+    def begin_run(self) -> None:
+        with self.__lock:
+            self.__cancelled = False
+            self.__cancellation_recorded = False
+        self.progress = RunProgress()
+        self.__storage_arguments = []
+        self.__pre_backup_hooks_succeeded = True
+        self.__backup_succeeded = False
+        self.run_context.run_id = uuid.uuid4().hex
+
+    def end_run(self) -> None:
+        if not self.__cancelled and self.__run_state_path.exists():
+            self.__run_state_path.unlink()
+
+    def interrupted_phase(self) -> Optional[str]:
+        try:
+            with open(self.__run_state_path, "r") as run_state_file:
+                run_state = json.load(run_state_file)
+        except FileNotFoundError:
+            return None
+        except Exception as exception:
+            self.logger.error(f"Couldn't read the previous run state: {exception}")
+            return None
+        if run_state.get("status") != "cancelled":
+            return None
+        return typing.cast(Optional[str], run_state.get("phase"))
+
+    def cancel(self) -> None:
+        with self.__lock:
+            self.__cancelled = True
+            self.__resumed.notify_all()
+            processes = list(self.__processes)
+
+        for process in processes:
+            self.logger.info(f"Cancelling the running subprocess {process.pid}")
+            send_signal(process=process, signal_to_send=signal.SIGCONT)
+            # duplicacy saves an incomplete snapshot on interrupt, which the next backup resumes from
+            send_signal(process=process, signal_to_send=signal.SIGINT)
+            threading.Thread(
+                target=self.__escalate_termination,
+                args=(process,),
+                name="termination",
+                daemon=True,
+            ).start()
+
+    def __escalate_termination(self, process: subprocess.Popen[bytes]) -> None:
+        for signal_to_send in [signal.SIGTERM, signal.SIGKILL]:
+            try:
+                process.wait(timeout=termination_grace_period / 2)
+                return
+            except subprocess.TimeoutExpired:
+                self.logger.warning(
+                    f"Subprocess is still running, sending {signal_to_send.name}"
+                )
+                send_signal(process=process, signal_to_send=signal_to_send)
+
+    def __record_cancellation(self, phase: str) -> None:
+        self.__cancellation_recorded = True
+        run_state = {
+            "status": "cancelled",
+            "phase": phase,
+            "cancelled_at": datetime.now().isoformat(),
+        }
+        try:
+            with open(self.__run_state_path, "w") as run_state_file:
+                json.dump(run_state, run_state_file)
+        except Exception as exception:
+            self.logger.error(f"Couldn't record the cancelled run state: {exception}")
+        for handler in self.logger.handlers:
+            handler.flush()
+
+    def __time_out(self, process: subprocess.Popen[bytes], name: str) -> None:
+        self.logger.warning(f"{name} timed out, sending SIGTERM")
+        send_signal(process=process, signal_to_send=signal.SIGTERM)
+        self.__escalate_termination(process)
+
+    @property
+    def paused(self) -> bool:
+        return self.__paused
+
+    def pause(self) -> None:
+        with self.__lock:
+            if self.__paused:
+                return
+            self.__paused = True
+            self.__paused_at = time.monotonic()
+            for process in self.__processes:
+                send_signal(process=process, signal_to_send=signal.SIGSTOP)
+
+    def resume(self) -> None:
+        with self.__lock:
+            if not self.__paused:
+                return
+            self.__paused = False
+            self.__paused_seconds += time.monotonic() - self.__paused_at
+            self.__resumed.notify_all()
+            for process in self.__processes:
+                send_signal(process=process, signal_to_send=signal.SIGCONT)
+
+    def __wait_while_paused(self) -> None:
+        # SIGSTOP only reaches running processes, so new ones aren't started until the run is resumed
+        with self.__lock:
+            if self.__paused and not self.__cancelled:
+                self.logger.info("The run is paused, waiting to resume")
+            # A cancelled run still runs its cleanup, even if paused
+            self.__resumed.wait_for(lambda: not self.__paused or self.__cancelled)
+
+    def __unpaused_time(self) -> float:
+        with self.__lock:
+            now = time.monotonic()
+            if self.__paused:
+                now = self.__paused_at
+            return now - self.__paused_seconds
+
+    def __enforce_timeout(
+        self,
+        process: subprocess.Popen[bytes],
+        name: str,
+        timeout: float,
+        finished: threading.Event,
+    ) -> None:
+        # Time spent paused doesn't count towards the timeout
+        deadline = self.__unpaused_time() + timeout
+        while not finished.wait(timeout=deadline - self.__unpaused_time()):
+            if self.__unpaused_time() >= deadline:
+                self.__time_out(process=process, name=name)
+                return
 
     def check_for_full_disk_access(self) -> None:
         if skip_check_for_full_disk_access_env.get() is not None:
             self.logger.info("Skipping full disk access check")
             return
+        if self.warm_state.full_disk_access_verified:
+            return
 
         try:
             os.listdir("/Library/Application Support/com.apple.TCC")
@@ -94,10 +452,203 @@ class Commands:
                 f"Check for full disk access failed. Aborting backup. See logs in {str(self.log_path.parent)}",
             )
             exit(1)
+        self.warm_state.full_disk_access_verified = True
+
+    def probe_storage(self) -> bool:
+        if probe_storage_env.get() is None:
+            self.logger.info("Skipping storage probe")
+            return True
+
+        try:
+            storages = read_duplicacy_storages(repository_path=Path.cwd())
+        except Exception as exception:
+            self.logger.error(f"Couldn't read storages for the probe: {exception}")
+            return True
+
+        prober = StorageProber(
+            sample_bytes=storage_probe_sample_bytes,
+            connect_timeout=storage_probe_connect_timeout,
+        )
+        results = [self.__probe_safely(prober, storage) for storage in storages]
+        for result in results:
+            self.logger.info(result.describe())
+
+        mirror_names = shlex.split(storage_mirrors_env.get() or "")
+        candidates = [
+            result for result in results if result.storage.name in mirror_names
+        ]
+        if len(candidates) == 0:
+            # Without mirrors duplicacy uses the storage named "default" or the first one
+            candidates = [
+                result for result in results if result.storage.name == "default"
+            ] or results[:1]
+
+        available = [result for result in candidates if result.reachable is not False]
+        if len(candidates) > 0 and len(available) == 0:
+            self.__subprocess_event_handler(
+                action="Backup",
+                url_to_ping=healthcheck_backup_url_env.get(),
+            ).on_storage_unavailable(
+                storage_names=[result.storage.name for result in candidates],
+            )
+            return False
+
+        if len(mirror_names) > 0 and len(available) > 0:
+            fastest = min(
+                available,
+                key=lambda result: (
+                    -(result.write_throughput or 0.0),
+                    result.latency if result.latency is not None else math.inf,
+                ),
+            )
+            self.logger.info(f"Using the fastest mirror {fastest.storage.name}")
+            self.__storage_arguments = ["-storage", fastest.storage.name]
+        return True
+
+    def __probe_safely(
+        self,
+        prober: StorageProber,
+        storage: DuplicacyStorage,
+    ) -> StorageProbeResult:
+        try:
+            return prober.probe(storage)
+        except Exception as exception:
+            # A storage that couldn't be probed is left to duplicacy, like an unknown storage type
+            self.logger.error(f"Couldn't probe storage {storage.name}: {exception}")
+            return StorageProbeResult(storage=storage, reachable=None)
+
+    def run_pre_backup_hooks(self) -> None:
+        self.__pre_backup_hooks_succeeded = self.__run_hooks(
+            stage="before_backup",
+            action="Pre-backup hooks",
+        )
+
+    def run_post_backup_hooks(self) -> None:
+        self.__run_hooks(
+            stage="after_backup",
+            action="Post-backup hooks",
+            ignore_cancellation=True,
+        )
+
+    def __run_hooks(
+        self,
+        stage: str,
+        action: str,
+        ignore_cancellation: bool = False,
+    ) -> bool:
+        hooks_path = hooks_path_env.get()
+        if hooks_path is None:
+            return True
+
+        subprocess_events_handler = self.__subprocess_event_handler(
+            action=action,
+            url_to_ping=None,
+        )
+        try:
+            hooks = read_hooks(hooks_path=Path(hooks_path), stage=stage)
+        except Exception as exception:
+            subprocess_events_handler.on_generic_failure(exception)
+            return False
+        if len(hooks) == 0:
+            return True
+
+        return self.__run_phase_safely(
+            run=lambda: self.__run_hook_stage(
+                hooks=hooks,
+                ignore_cancellation=ignore_cancellation,
+            ),
+            on_start=lambda: None,
+            subprocess_events_handler=subprocess_events_handler,
+            ignore_cancellation=ignore_cancellation,
+        )
+
+    def __run_hook_stage(self, hooks: List[Hook], ignore_cancellation: bool) -> int:
+        started_at = time.monotonic()
+        results: Dict[str, HookResult] = dict()
+        finished = {hook.name: threading.Event() for hook in hooks}
+
+        def run(hook: Hook) -> None:
+            try:
+                for dependency in hook.depends_on:
+                    finished[dependency].wait()
+                if (self.__cancelled and not ignore_cancellation) or any(
+                    results[dependency].status != "succeeded"
+                    for dependency in hook.depends_on
+                ):
+                    results[hook.name] = HookResult(name=hook.name, status="skipped")
+                else:
+                    results[hook.name] = self.__run_hook(
+                        hook=hook,
+                        ignore_cancellation=ignore_cancellation,
+                    )
+            finally:
+                finished[hook.name].set()
+
+        # Every hook waits for its dependencies, so independent ones run concurrently
+        threads = [
+            threading.Thread(target=run, args=(hook,), name=f"hook-{hook.name}")
+            for hook in hooks
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ordered_results = [results[hook.name] for hook in hooks]
+        self.logger.info(
+            f"Hooks finished in {time.monotonic() - started_at:.1f}s: {', '.join(result.describe() for result in ordered_results)}",
+            extra={
+                "fields": {"hooks": [result.as_dict() for result in ordered_results]}
+            },
+        )
+        unsuccessful = [
+            result.name for result in ordered_results if result.status != "succeeded"
+        ]
+        if len(unsuccessful) > 0:
+            raise HooksFailedException(f"Unsuccessful hooks: {', '.join(unsuccessful)}")
+        return 0
+
+    def __run_hook(self, hook: Hook, ignore_cancellation: bool) -> HookResult:
+        started_at = time.monotonic()
+        try:
+            exit_code = self.__run_subprocess(
+                args=hook.command,
+                hook_name=hook.name,
+                timeout=hook.timeout,
+                ignore_cancellation=ignore_cancellation,
+            )
+        except Exception as exception:
+            self.logger.error(f"[{hook.name}] couldn't run: {exception}")
+            return HookResult(
+                name=hook.name,
+                status="failed",
+                seconds=time.monotonic() - started_at,
+            )
+
+        seconds = time.monotonic() - started_at
+        status = "succeeded"
+        if exit_code != 0:
+            timed_out = hook.timeout is not None and seconds >= hook.timeout
+            status = "timed out" if timed_out else "failed"
+        return HookResult(
+            name=hook.name,
+            status=status,
+            exit_code=exit_code,
+            seconds=seconds,
+        )
 
     def run_backup(self) -> None:
-        self.__run_subprocess_safely(
-            args=[duplicacy_path_env.get_unwrapped(), "backup", "-stats"],
+        if not self.__cancelled and not self.__pre_backup_hooks_succeeded:
+            self.__subprocess_event_handler(
+                action="Backup",
+                url_to_ping=healthcheck_backup_url_env.get(),
+            ).on_generic_failure(HooksFailedException("Pre-backup hooks failed"))
+            return
+
+        self.__backup_succeeded = self.__run_subprocess_safely(
+            args=self.__duplicacy_arguments()
+            + ["backup", "-stats"]
+            + self.__storage_arguments,
             on_start=lambda: show_alert("Beginning backup", timeout=3),
             subprocess_events_handler=self.__subprocess_event_handler(
                 action="Backup",
@@ -105,13 +656,61 @@ class Commands:
             ),
         )
 
+    def run_growth_report(self) -> None:
+        top = growth_report_top_env.get()
+        if top is None:
+            self.logger.info("Skipping growth report")
+            return
+        if not self.__backup_succeeded:
+            self.logger.info("Skipping growth report, there's no new revision")
+            return
+
+        self.__run_phase_safely(
+            run=lambda: self.__report_growth(
+                top=int(top),
+                depth=int(growth_report_depth_env.get() or default_growth_report_depth),
+            ),
+            on_start=lambda: None,
+            subprocess_events_handler=self.__subprocess_event_handler(
+                action="Growth report",
+                url_to_ping=None,
+            ),
+        )
+
+    def __report_growth(self, top: int, depth: int) -> int:
+        revisions = self.__revisions()
+        if len(revisions) < 2:
+            self.logger.info("Skipping growth report, there's no previous revision")
+            return 0
+
+        previous, current = revisions[-2:]
+        report = GrowthReport(
+            previous_revision=previous.number,
+            current_revision=current.number,
+        )
+        report.load_previous(self.__list_files(revision=previous))
+        report.compare(self.__list_files(revision=current), depth=depth)
+
+        summary = report.summary(top=top)
+        self.logger.info(summary, extra={"fields": report.as_dict(top=top)})
+        report_path = self.log_path.parent.joinpath("growth_report.json")
+        with open(report_path, "w") as report_file:
+            json.dump(report.as_dict(top=top), report_file, indent=2)
+        self.__subprocess_event_handler(
+            action="Backup",
+            url_to_ping=healthcheck_backup_url_env.get(),
+        ).on_report(summary)
+        return 0
+
     def run_prune(self) -> None:
         if prune_keep_arguments is None:
             self.logger.info("Skipping prune")
             return
 
         self.__run_subprocess_safely(
-            args=[duplicacy_path_env.get_unwrapped(), "prune"]
+            args=self.__duplicacy_arguments()
+            + ["prune"]
+            + self.__storage_arguments
             + flatten(
                 [["-keep", interval] for interval in shlex.split(prune_keep_arguments)]
             ),
@@ -124,7 +723,7 @@ class Commands:
 
     def run_check(self) -> None:
         self.__run_subprocess_safely(
-            args=[duplicacy_path_env.get_unwrapped(), "check"],
+            args=self.__duplicacy_arguments() + ["check"] + self.__storage_arguments,
             on_start=lambda: None,
             subprocess_events_handler=self.__subprocess_event_handler(
                 action="Check",
@@ -132,6 +731,298 @@ class Commands:
             ),
         )
 
+    def run_verification(self) -> None:
+        sample_bytes = verify_sample_bytes_env.get()
+        if sample_bytes is None:
+            self.logger.info("Skipping verification")
+            return
+
+        self.__run_phase_safely(
+            run=lambda: self.__verify_sample(
+                byte_budget=int(sample_bytes),
+                time_budget=float(verify_time_budget_env.get() or 30 * 60),
+                coverage_days=float(verify_coverage_days_env.get() or 30),
+            ),
+            on_start=lambda: None,
+            subprocess_events_handler=self.__subprocess_event_handler(
+                action="Verification",
+                url_to_ping=healthcheck_verify_url_env.get(),
+            ),
+        )
+
+    def __verify_sample(
+        self,
+        byte_budget: int,
+        time_budget: float,
+        coverage_days: float,
+    ) -> int:
+        started_at = time.monotonic()
+        revision = self.__latest_revision()
+        coverage = VerificationCoverage(
+            database_path=self.log_path.parent.joinpath("verification_coverage.sqlite3")
+        )
+        verified: List[str] = []
+        try:
+            coverage.load_listing(self.__list_files(revision=revision))
+            overdue_before = time.time() - coverage_days * 24 * 60 * 60
+            sample = coverage.select(
+                byte_budget=byte_budget,
+                max_files=verify_max_files,
+                overdue_before=overdue_before,
+            )
+            self.logger.info(
+                f"Verifying {len(sample)} files, {sum(file.size for file in sample)} bytes from revision {revision.number}"
+            )
+
+            changed: List[str] = []
+            mismatched: List[str] = []
+            repository_path = Path.cwd()
+            with temporary_restore_area(repository_path=repository_path) as area:
+                for batch in verification_batches(
+                    files=sample,
+                    max_files=verify_restore_batch_size,
+                    max_bytes=verify_restore_batch_bytes,
+                ):
+                    if time.monotonic() - started_at > time_budget:
+                        self.logger.warning("Verification time budget is exhausted")
+                        break
+                    exit_code = self.__run_subprocess(
+                        args=self.__duplicacy_arguments()
+                        + ["restore"]
+                        + ["-r", str(revision.number)]
+                        + self.__storage_arguments
+                        + ["--"]
+                        + [restore_pattern(file.path) for file in batch],
+                        cwd=area,
+                    )
+                    if exit_code != 0:
+                        return exit_code
+
+                    for file in batch:
+                        live_path = repository_path.joinpath(file.path)
+                        if not live_file_matches_snapshot(live_path, file):
+                            changed.append(file.path)
+                            continue
+                        restored_path = area.joinpath(file.path)
+                        if not restored_path.exists() or file_digest(
+                            restored_path
+                        ) != file_digest(live_path):
+                            mismatched.append(file.path)
+                            continue
+                        verified.append(file.path)
+
+            self.logger.info(
+                f"Verified {len(verified)} files in {time.monotonic() - started_at:.0f}s, {len(changed)} changed since the backup, {len(mismatched)} mismatched. {coverage.covered_fraction(verified_after=overdue_before):.1%} of files verified within {coverage_days:g} days"
+            )
+        finally:
+            # Files verified by earlier batches keep their coverage if a later one fails
+            coverage.mark_verified(paths=verified, verified_at=time.time())
+            coverage.close()
+
+        for path in mismatched:
+            self.logger.error(f"Restored content doesn't match: {path}")
+        if len(mismatched) > 0:
+            raise VerificationFailedException(
+                f"{len(mismatched)} restored files don't match the live ones"
+            )
+        return 0
+
+    def run_restore_drill(self) -> None:
+        byte_budget = restore_drill_bytes_env.get()
+        paths = shlex.split(restore_drill_paths_env.get() or "")
+        if byte_budget is None and len(paths) == 0:
+            self.logger.info("Skipping restore drill")
+            return
+
+        history = RestoreDrillHistory(
+            path=self.log_path.parent.joinpath("restore_drill.json")
+        )
+        interval_days = float(
+            restore_drill_interval_days_env.get() or default_restore_drill_interval_days
+        )
+        last_drill_at = history.last_drill_at()
+        if last_drill_at is not None and datetime.now() - last_drill_at < timedelta(
+            days=interval_days
+        ):
+            self.logger.info(
+                f"Skipping restore drill, the last one was at {last_drill_at.isoformat()}"
+            )
+            return
+
+        subprocess_events_handler = self.__subprocess_event_handler(
+            action="Restore drill",
+            url_to_ping=healthcheck_restore_drill_url_env.get(),
+        )
+        self.__run_phase_safely(
+            run=lambda: self.__restore_drill(
+                byte_budget=optional_int(byte_budget),
+                paths=paths,
+                threads=int(
+                    restore_drill_threads_env.get() or default_restore_drill_threads
+                ),
+                history=history,
+                subprocess_events_handler=subprocess_events_handler,
+            ),
+            on_start=lambda: None,
+            subprocess_events_handler=subprocess_events_handler,
+        )
+
+    def __restore_drill(
+        self,
+        byte_budget: Optional[int],
+        paths: List[str],
+        threads: int,
+        history: RestoreDrillHistory,
+        subprocess_events_handler: SubprocessEventsHandler,
+    ) -> int:
+        revision = self.__latest_revision()
+        listing = self.__list_files(revision=revision)
+        if len(paths) > 0:
+            prefixes = [path.strip("/") for path in paths]
+            files = [
+                file
+                for file in listing
+                if any(
+                    file.path == prefix or file.path.startswith(prefix + "/")
+                    for prefix in prefixes
+                )
+            ]
+            patterns = [f"i:^{re.escape(prefix)}(/|$)" for prefix in prefixes]
+        else:
+            directories = select_restore_drill_directories(
+                files=listing,
+                byte_budget=byte_budget or 0,
+                max_directories=restore_drill_max_directories,
+            )
+            files = flatten(list(directories.values()))
+            patterns = [
+                f"i:^{re.escape(directory + '/' if directory != '' else '')}[^/]+$"
+                for directory in directories
+            ]
+        if len(files) == 0:
+            raise SubprocessFailedException(
+                f"Revision {revision.number} has no files to restore in the drill"
+            )
+
+        result = RestoreDrillResult(
+            revision=revision.number,
+            files=len(files),
+            bytes=sum(file.size for file in files),
+        )
+        self.logger.info(
+            f"Restoring {result.files} files, {format_size(result.bytes)} from revision {revision.number} with {threads} threads"
+        )
+        repository_path = Path.cwd()
+        # The drill downloads from the storage like a real recovery would, without the chunk cache
+        with temporary_restore_area(
+            repository_path=repository_path,
+            share_cache=False,
+        ) as area:
+            started_at = time.monotonic()
+
+            def on_output(line: str) -> None:
+                if (
+                    result.time_to_first_byte is None
+                    and restore_downloaded_pattern.search(line) is not None
+                ):
+                    result.time_to_first_byte = time.monotonic() - started_at
+
+            exit_code = self.__run_subprocess(
+                args=self.__duplicacy_arguments()
+                + ["restore", "-r", str(revision.number)]
+                + ["-threads", str(threads), "-stats"]
+                + self.__storage_arguments
+                + ["--"]
+                + patterns,
+                cwd=area,
+                on_output=on_output,
+            )
+            result.seconds = time.monotonic() - started_at
+            if exit_code != 0:
+                return exit_code
+
+            mismatched: List[str] = []
+            for file in files:
+                if restored_file_matches(
+                    restored_path=area.joinpath(file.path),
+                    live_path=repository_path.joinpath(file.path),
+                    snapshot_file=file,
+                ):
+                    result.verified += 1
+                else:
+                    mismatched.append(file.path)
+            result.mismatched = len(mismatched)
+
+        summary = result.describe()
+        self.logger.info(summary, extra={"fields": result.as_dict()})
+        history.record(result=result)
+        subprocess_events_handler.on_report(summary)
+
+        for path in mismatched:
+            self.logger.error(f"Restored content doesn't match: {path}")
+        if len(mismatched) > 0:
+            raise VerificationFailedException(
+                f"{len(mismatched)} files restored in the drill don't match"
+            )
+        return 0
+
+    def __latest_revision(self) -> SnapshotRevision:
+        revisions = self.__revisions()
+        if len(revisions) == 0:
+            raise SubprocessFailedException("Couldn't find any snapshot revisions")
+        return revisions[-1]
+
+    def __revisions(self) -> List[SnapshotRevision]:
+        revisions = [
+            revision
+            for revision in map(
+                parse_snapshot_revision,
+                self.__iterate_subprocess_output(
+                    args=[duplicacy_path_env.get_unwrapped(), "list"]
+                    + self.__storage_arguments,
+                ),
+            )
+            if revision is not None
+        ]
+        return sorted(revisions, key=lambda revision: revision.number)
+
+    def __list_files(self, revision: SnapshotRevision) -> List[SnapshotFile]:
+        listings = self.warm_state.snapshot_listings
+        storage = self.__storage_name()
+        if any(listed_storage != storage for listed_storage, _ in listings):
+            # A run on another mirror makes the kept listings useless
+            listings.clear()
+        if (storage, revision.number) in listings:
+            return listings[(storage, revision.number)]
+
+        listing = [
+            snapshot_file
+            for snapshot_file in map(
+                parse_snapshot_file,
+                self.__iterate_subprocess_output(
+                    args=[duplicacy_path_env.get_unwrapped(), "list", "-files"]
+                    + ["-r", str(revision.number)]
+                    + self.__storage_arguments,
+                ),
+            )
+            if snapshot_file is not None
+        ]
+        listings[(storage, revision.number)] = listing
+        for key in sorted(listings)[:-snapshot_listings_kept]:
+            del listings[key]
+        return listing
+
+    def __storage_name(self) -> str:
+        if len(self.__storage_arguments) == 0:
+            return "default"
+        return self.__storage_arguments[-1]
+
+    def __duplicacy_arguments(self) -> List[str]:
+        if log_format_env.get() == json_log_format:
+            # Log-style output carries the level and message code of every line
+            return [duplicacy_path_env.get_unwrapped(), "-log"]
+        return [duplicacy_path_env.get_unwrapped()]
+
     def __subprocess_event_handler(
         self,
         action: str,
@@ -149,25 +1040,124 @@ class Commands:
         args: List[str],
         on_start: Callable[[], None],
         subprocess_events_handler: SubprocessEventsHandler,
-    ) -> None:
+    ) -> bool:
+        return self.__run_phase_safely(
+            run=lambda: self.__run_subprocess(args=args),
+            on_start=on_start,
+            subprocess_events_handler=subprocess_events_handler,
+        )
+
+    def __run_phase_safely(
+        self,
+        run: Callable[[], int],
+        on_start: Callable[[], None],
+        subprocess_events_handler: SubprocessEventsHandler,
+        ignore_cancellation: bool = False,
+    ) -> bool:
+        # Cleanup phases still run and report their own result after a cancellation
+        if self.__cancelled and not ignore_cancellation:
+            if self.__cancellation_recorded:
+                self.logger.info(
+                    f"Skipping {subprocess_events_handler.action}, the run was cancelled"
+                )
+            else:
+                self.__cancel_phase(subprocess_events_handler)
+            return False
+
         try:
+            self.run_context.phase = subprocess_events_handler.action
+            # Paired with the result message by lib.schedule_simulator to measure phase durations
+            self.logger.info(f"{subprocess_events_handler.action} started")
+            self.progress.start_phase(subprocess_events_handler.action)
+            self.__cache_manager.begin_phase()
             on_start()
-            subprocess_exit_code = self.__run_subprocess(args=args)
-            if subprocess_exit_code != 0:
+            subprocess_exit_code = run()
+            if self.__cancelled and not ignore_cancellation:
+                self.__cancel_phase(subprocess_events_handler)
+            elif subprocess_exit_code != 0:
                 subprocess_events_handler.on_non_zero_exit_code(subprocess_exit_code)
             else:
                 subprocess_events_handler.on_zero_exit_code()
+                return True
         except Exception as exception:
-            subprocess_events_handler.on_generic_failure(exception)
+            if self.__cancelled and not ignore_cancellation:
+                self.__cancel_phase(subprocess_events_handler)
+            else:
+                subprocess_events_handler.on_generic_failure(exception)
+        finally:
+            self.__cache_manager.end_phase(phase=subprocess_events_handler.action)
+            self.run_context.phase = None
+        return False
+
+    def __cancel_phase(
+        self, subprocess_events_handler: SubprocessEventsHandler
+    ) -> None:
+        # launchd's ExitTimeOut leaves little time, so the state to resume from is saved before reporting
+        self.__record_cancellation(phase=subprocess_events_handler.action)
+        subprocess_events_handler.on_cancelled()
 
-    def __run_subprocess(self, args: List[str]) -> int:
+    def __iterate_subprocess_output(self, args: List[str]) -> Iterator[str]:
         self.logger.info(f"Running subprocess: {args}")
 
-        process = subprocess.Popen(
-            args=args,
-            stderr=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-        )
+        with self.__lock:
+            self.__wait_while_paused()
+            if self.__cancelled:
+                raise RunCancelledException()
+            process = subprocess.Popen(
+                args=args,
+                stderr=subprocess.STDOUT,
+                stdout=subprocess.PIPE,
+            )
+            self.__processes.append(process)
+
+        try:
+            for bytes_line in process.stdout:  # type: ignore
+                yield bytes_line.decode(errors="replace")
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            with self.__lock:
+                self.__processes.remove(process)
+
+        if process.returncode != 0:
+            raise SubprocessFailedException(
+                f"{args} failed with exit code: {process.returncode}"
+            )
+
+    def __run_subprocess(
+        self,
+        args: List[str],
+        cwd: Optional[Path] = None,
+        hook_name: Optional[str] = None,
+        timeout: Optional[float] = None,
+        on_output: Optional[Callable[[str], None]] = None,
+        ignore_cancellation: bool = False,
+    ) -> int:
+        self.logger.info(f"Running subprocess: {args}")
+
+        with self.__lock:
+            self.__wait_while_paused()
+            if self.__cancelled and not ignore_cancellation:
+                return -signal.SIGTERM
+            process = subprocess.Popen(
+                args=args,
+                stderr=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                cwd=cwd,
+                # A hook gets its own process group, so signals reach commands started by its shell
+                start_new_session=hook_name is not None,
+            )
+            self.__processes.append(process)
+
+        finished = threading.Event()
+        if timeout is not None:
+            threading.Thread(
+                target=self.__enforce_timeout,
+                args=(process, hook_name or args[0], timeout, finished),
+                name="timeout",
+                daemon=True,
+            ).start()
 
         selector = PollSelector()
         selector.register(process.stdout, selectors.EVENT_READ)  # type: ignore
@@ -177,6 +1167,7 @@ class Commands:
             ready = selector.select()
             for key, events in ready:
                 bytes_line = key.fileobj.readline()  # type: ignore
+                read_at = time.monotonic()
                 if len(bytes_line) == 0:
                     selector.unregister(key.fileobj)
                     continue
@@ -188,16 +1179,172 @@ class Commands:
                     self.logger.error(e)
                     log = bytes_line
 
+                if hook_name is not None:
+                    # Output of concurrent hooks is interleaved in the log
+                    log = f"[{hook_name}] {log!s}"
                 if key.fileobj == process.stdout:
-                    self.logger.info(log)
+                    self.logger.info(
+                        log,
+                        extra={
+                            "stream": "stdout",
+                            "hook": hook_name,
+                            "monotonic": read_at,
+                        },
+                    )
                 if key.fileobj == process.stderr:
-                    self.logger.error(log)
+                    self.logger.error(
+                        log,
+                        extra={
+                            "stream": "stderr",
+                            "hook": hook_name,
+                            "monotonic": read_at,
+                        },
+                    )
+                if isinstance(log, str):
+                    self.progress.on_output(log)
+                    if on_output is not None:
+                        on_output(log)
 
         process.wait()
+        finished.set()
+        with self.__lock:
+            self.__processes.remove(process)
 
         return process.returncode
 
 
+class RunCancelledException(Exception):
+    pass
+
+
+class SubprocessFailedException(Exception):
+    pass
+
+
+class VerificationFailedException(Exception):
+    pass
+
+
+class HooksFailedException(Exception):
+    pass
+
+
+class HookConfigurationException(Exception):
+    pass
+
+
+@dataclass
+class Hook:
+    name: str
+    command: List[str]
+    timeout: Optional[float] = None
+    depends_on: List[str] = field(default_factory=list)
+
+
+@dataclass
+class HookResult:
+    name: str
+    status: str
+    exit_code: Optional[int] = None
+    seconds: float = 0.0
+
+    def describe(self) -> str:
+        if self.status == "skipped":
+            return f"{self.name} skipped"
+        return f"{self.name} {self.status} in {self.seconds:.1f}s"
+
+    def as_dict(self) -> Dict[str, typing.Any]:
+        return {
+            "name": self.name,
+            "status": self.status,
+            "exit_code": self.exit_code,
+            "seconds": self.seconds,
+        }
+
+
+def read_hooks(hooks_path: Path, stage: str) -> List[Hook]:
+    with open(hooks_path, "r") as hooks_file:
+        configuration = json.load(hooks_file)
+    if not isinstance(configuration, dict):
+        raise HookConfigurationException(f"{hooks_path} must contain an object")
+    unknown_stages = set(configuration.keys()) - set(hook_stages)
+    if len(unknown_stages) > 0:
+        raise HookConfigurationException(
+            f"Unknown hook stages: {', '.join(sorted(unknown_stages))}. Supported stages are {', '.join(hook_stages)}"
+        )
+
+    hooks = [parse_hook(value) for value in configuration.get(stage, [])]
+    names = [hook.name for hook in hooks]
+    if len(set(names)) != len(names):
+        raise HookConfigurationException(f"Hook names in {stage} must be unique")
+    for hook in hooks:
+        for dependency in hook.depends_on:
+            if dependency not in names:
+                raise HookConfigurationException(
+                    f"{hook.name} depends on {dependency}, which isn't a {stage} hook"
+                )
+
+    # Hooks whose dependencies can never finish would wait forever
+    resolved: List[str] = []
+    unresolved = list(hooks)
+    while len(unresolved) > 0:
+        ready = [
+            hook
+            for hook in unresolved
+            if all(dependency in resolved for dependency in hook.depends_on)
+        ]
+        if len(ready) == 0:
+            raise HookConfigurationException(
+                f"Dependency cycle between {stage} hooks: {', '.join(hook.name for hook in unresolved)}"
+            )
+        resolved += [hook.name for hook in ready]
+        unresolved = [hook for hook in unresolved if hook not in ready]
+    return hooks
+
+
+def parse_hook(value: typing.Any) -> Hook:
+    if not isinstance(value, dict) or not isinstance(value.get("name"), str):
+        raise HookConfigurationException(f"Hook must be an object with a name: {value}")
+
+    name = value["name"]
+    command = value.get("command")
+    if isinstance(command, str):
+        command = ["/bin/sh", "-c", command]
+    if (
+        not isinstance(command, list)
+        or len(command) == 0
+        or not all(isinstance(argument, str) for argument in command)
+    ):
+        raise HookConfigurationException(
+            f"Command of {name} must be a string or a list of strings"
+        )
+
+    timeout = value.get("timeout")
+    if timeout is not None and (
+        not isinstance(timeout, (int, float))
+        or isinstance(timeout, bool)
+        or timeout <= 0
+    ):
+        raise HookConfigurationException(
+            f"Timeout of {name} must be a positive number of seconds"
+        )
+
+    depends_on = value.get("depends_on", [])
+    if not isinstance(depends_on, list) or not all(
+        isinstance(dependency, str) for dependency in depends_on
+    ):
+        raise HookConfigurationException(
+            f"depends_on of {name} must be a list of hook names"
+        )
+
+    return Hook(
+        name=name,
+        command=command,
+        timeout=float(timeout) if timeout is not None else None,
+        depends_on=depends_on,
+    )
+
+
 @dataclass
 class SubprocessEventsHandler:
     action: str
@@ -230,9 +1377,47 @@ class SubprocessEventsHandler:
         )
         show_alert(message)
 
-    def __report_to_healthcheck(
+    def on_storage_unavailable(self, storage_names: List[str]) -> None:
+        message = (
+            f"{self.action} skipped, storage is unreachable: {', '.join(storage_names)}"
+        )
+        self.logger.error(message)
+        self.__report_to_healthcheck(
+            result=JobFailureWithCode(exit_code=storage_unavailable_exit_code),
+        )
+        show_alert(f"{message}. See logs in {str(self.log_path)}")
+
+    def on_report(self, report: str) -> None:
+        if self.url_to_ping is None:
+            return
+        try:
+            # Attaches the report to the check without changing its status
+            urlopen(
+                Request(self.url_to_ping + "/log", data=report.encode()),
+                timeout=healthcheck_connection_timeout,
+            )
+        except Exception as exception:
+            self.logger.error(
+                f"Couldn't attach the report to {self.action}: {exception}"
+            )
+
+    def on_cancelled(self) -> None:
+        message = f"{self.action} was cancelled"
+        self.logger.warning(message)
+        try:
+            self.__report_to_healthcheck(
+                result=JobCancelled(),
+            )
+        except Exception as exception:
+            # The network is often already gone when the service is stopped on shutdown or sleep
+            self.logger.error(
+                f"Couldn't report the cancellation of {self.action}: {exception}"
+            )
+        show_alert(message, timeout=3)
+
+    def __report_to_healthcheck(
         self,
-        result: Union[JobSuccess, JobGenericFailure, JobFailureWithCode],
+        result: Union[JobSuccess, JobGenericFailure, JobFailureWithCode, JobCancelled],
     ) -> None:
         if self.url_to_ping is None:
             self.logger.info(f"Skipping healthcheck ping for {self.action}")
@@ -244,6 +1429,9 @@ class SubprocessEventsHandler:
             self.url_to_ping += "/fail"
         elif isinstance(result, JobFailureWithCode):
             self.url_to_ping += f"/{result.exit_code}"
+        elif isinstance(result, JobCancelled):
+            # Exit status of a process terminated by SIGTERM
+            self.url_to_ping += f"/{128 + signal.SIGTERM}"
 
         urlopen(self.url_to_ping, timeout=healthcheck_connection_timeout)
 
@@ -263,6 +1451,1027 @@ class JobFailureWithCode:
     exit_code: int
 
 
+@dataclass
+class JobCancelled:
+    pass
+
+
+@dataclass
+class DuplicacyStorage:
+    name: str
+    url: str
+
+
+def read_duplicacy_storages(repository_path: Path) -> List[DuplicacyStorage]:
+    with open(repository_path.joinpath(".duplicacy", "preferences"), "r") as file:
+        preferences = json.load(file)
+    return [
+        DuplicacyStorage(name=preference["name"], url=preference["storage"])
+        for preference in preferences
+    ]
+
+
+@dataclass
+class StorageProbeResult:
+    storage: DuplicacyStorage
+    # None when the storage type can't be probed without duplicacy credentials
+    reachable: Optional[bool]
+    latency: Optional[float] = None
+    write_throughput: Optional[float] = None
+    read_throughput: Optional[float] = None
+    error: Optional[str] = None
+
+    def describe(self) -> str:
+        description = f"Storage {self.storage.name} ({self.storage.url}): "
+        if self.reachable is None:
+            return description + "not probed"
+        if not self.reachable:
+            return description + f"unreachable: {self.error}"
+        description += f"latency {(self.latency or 0.0) * 1000:.1f} ms"
+        if self.write_throughput is not None and self.read_throughput is not None:
+            description += f", write {self.write_throughput / 1024**2:.1f} MB/s, read {self.read_throughput / 1024**2:.1f} MB/s"
+        return description
+
+
+@dataclass
+class StorageProber:
+    sample_bytes: int
+    connect_timeout: float
+
+    def probe(self, storage: DuplicacyStorage) -> StorageProbeResult:
+        url = urlsplit(storage.url)
+        if url.scheme == "":
+            return self.__probe_local(storage=storage, path=Path(storage.url))
+        if url.scheme == "file":
+            return self.__probe_local(storage=storage, path=Path(url.path))
+
+        host = storage_probe_host(scheme=url.scheme, hostname=url.hostname)
+        if host is None:
+            return StorageProbeResult(storage=storage, reachable=None)
+        return self.__probe_remote(
+            storage=storage,
+            address=(host, url.port or storage_probe_ports.get(url.scheme, 443)),
+        )
+
+    def __probe_remote(
+        self,
+        storage: DuplicacyStorage,
+        address: typing.Tuple[str, int],
+    ) -> StorageProbeResult:
+        started_at = time.monotonic()
+        try:
+            socket.create_connection(address, timeout=self.connect_timeout).close()
+        except OSError as exception:
+            return StorageProbeResult(
+                storage=storage,
+                reachable=False,
+                error=str(exception),
+            )
+        return StorageProbeResult(
+            storage=storage,
+            reachable=True,
+            latency=time.monotonic() - started_at,
+        )
+
+    def __probe_local(
+        self, storage: DuplicacyStorage, path: Path
+    ) -> StorageProbeResult:
+        sample = os.urandom(self.sample_bytes)
+        sample_path = path.joinpath(f".duplicacy_probe.{os.getpid()}")
+        try:
+            started_at = time.monotonic()
+            path.stat()
+            latency = time.monotonic() - started_at
+
+            started_at = time.monotonic()
+            with open(sample_path, "wb") as sample_file:
+                sample_file.write(sample)
+                sample_file.flush()
+                os.fsync(sample_file.fileno())
+            write_duration = time.monotonic() - started_at
+
+            started_at = time.monotonic()
+            with open(sample_path, "rb") as sample_file:
+                read_back = sample_file.read()
+            read_duration = time.monotonic() - started_at
+        except OSError as exception:
+            return StorageProbeResult(
+                storage=storage,
+                reachable=False,
+                error=str(exception),
+            )
+        finally:
+            try:
+                sample_path.unlink()
+            except OSError:
+                # Also when the sample couldn't be written in the first place
+                pass
+
+        if read_back != sample:
+            return StorageProbeResult(
+                storage=storage,
+                reachable=False,
+                error="sample read back doesn't match the written one",
+            )
+        return StorageProbeResult(
+            storage=storage,
+            reachable=True,
+            latency=latency,
+            write_throughput=len(sample) / max(write_duration, 1e-9),
+            read_throughput=len(sample) / max(read_duration, 1e-9),
+        )
+
+
+# Storages whose URL doesn't carry the host to connect to
+storage_probe_hosts = {
+    "b2": "api.backblazeb2.com",
+    "gcs": "storage.googleapis.com",
+    "gcd": "www.googleapis.com",
+    "one": "graph.microsoft.com",
+    "odb": "graph.microsoft.com",
+    "dropbox": "api.dropboxapi.com",
+}
+# Storages whose URL carries an explicit endpoint, as in "minio://region@host/bucket"
+storage_probe_endpoint_schemes = [
+    "sftp",
+    "webdav",
+    "webdav-http",
+    "s3",
+    "s3c",
+    "minio",
+    "minios",
+    "wasabi",
+]
+storage_probe_ports = {
+    "sftp": 22,
+    "webdav-http": 80,
+    "minio": 80,
+}
+
+
+def storage_probe_host(scheme: str, hostname: Optional[str]) -> Optional[str]:
+    if scheme in storage_probe_hosts:
+        return storage_probe_hosts[scheme]
+    if hostname is None:
+        return None
+    if scheme == "azure":
+        # "azure://account/container"
+        return f"{hostname}.blob.core.windows.net"
+    if scheme == "s3" and hostname == "amazon.com":
+        return "s3.amazonaws.com"
+    if scheme in storage_probe_endpoint_schemes:
+        return hostname
+    # Other storages, like hubic or swift, can't be probed without their credentials
+    return None
+
+
+@dataclass
+class SnapshotRevision:
+    number: int
+    created_at: str
+
+
+@dataclass
+class SnapshotFile:
+    path: str
+    size: int
+    modified_at: str
+    hash: Optional[str] = None
+
+
+snapshot_revision_pattern = re.compile(
+    r"^Snapshot \S+ revision (\d+) created at (\d{4}-\d{2}-\d{2} \d{2}:\d{2})"
+)
+# "<size> <yyyy-mm-dd> <hh:mm:ss> <hash> <path>" as printed by "duplicacy list -files"
+snapshot_file_pattern = re.compile(
+    r"^\s*(\d+) (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) ([0-9a-f]+) (.+[^/])$"
+)
+
+
+def parse_snapshot_revision(line: str) -> Optional[SnapshotRevision]:
+    match = snapshot_revision_pattern.match(line)
+    if match is None:
+        return None
+    return SnapshotRevision(number=int(match.group(1)), created_at=match.group(2))
+
+
+def parse_snapshot_file(line: str) -> Optional[SnapshotFile]:
+    match = snapshot_file_pattern.match(line.rstrip("\n"))
+    if match is None:
+        return None
+    return SnapshotFile(
+        path=match.group(4),
+        size=int(match.group(1)),
+        modified_at=match.group(2),
+        hash=match.group(3),
+    )
+
+
+@dataclass
+class DirectoryGrowth:
+    directory: str
+    new_files: int = 0
+    new_bytes: int = 0
+    changed_files: int = 0
+    changed_bytes: int = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self.new_bytes + self.changed_bytes
+
+    def as_dict(self) -> Dict[str, typing.Any]:
+        return {
+            "directory": self.directory,
+            "new_files": self.new_files,
+            "new_bytes": self.new_bytes,
+            "changed_files": self.changed_files,
+            "changed_bytes": self.changed_bytes,
+        }
+
+
+@dataclass
+class GrowthReport:
+    previous_revision: int
+    current_revision: int
+    total: DirectoryGrowth = field(default_factory=lambda: DirectoryGrowth("."))
+    removed_files: int = 0
+    removed_bytes: int = 0
+    directories: Dict[str, DirectoryGrowth] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.__previous: Dict[str, typing.Tuple[int, Optional[str]]] = dict()
+
+    def load_previous(self, files: typing.Iterable[SnapshotFile]) -> None:
+        for file in files:
+            self.__previous[file.path] = (file.size, file.hash)
+
+    def compare(self, files: typing.Iterable[SnapshotFile], depth: int) -> None:
+        for file in files:
+            previous = self.__previous.pop(file.path, None)
+            if previous == (file.size, file.hash):
+                continue
+            directory = "/".join(file.path.split("/")[:-1][:depth]) or "."
+            growth = self.directories.get(directory)
+            if growth is None:
+                growth = self.directories[directory] = DirectoryGrowth(directory)
+            for counted in [growth, self.total]:
+                if previous is None:
+                    counted.new_files += 1
+                    counted.new_bytes += file.size
+                else:
+                    counted.changed_files += 1
+                    counted.changed_bytes += file.size
+        # Whatever wasn't matched by the new revision has been removed
+        self.removed_files = len(self.__previous)
+        self.removed_bytes = sum(size for size, _ in self.__previous.values())
+        self.__previous.clear()
+
+    def top(self, count: int) -> List[DirectoryGrowth]:
+        return heapq.nlargest(
+            count,
+            self.directories.values(),
+            key=lambda growth: growth.total_bytes,
+        )
+
+    def summary(self, top: int) -> str:
+        lines = [
+            f"Revision {self.current_revision} added {self.total.new_files} files, {format_size(self.total.new_bytes)} and changed {self.total.changed_files} files, {format_size(self.total.changed_bytes)} since revision {self.previous_revision}. {self.removed_files} files, {format_size(self.removed_bytes)} were removed"
+        ]
+        for growth in self.top(top):
+            lines.append(
+                f"  {growth.directory}: {format_size(growth.total_bytes)} ({growth.new_files} new, {growth.changed_files} changed files)"
+            )
+        return "\n".join(lines)
+
+    def as_dict(self, top: int) -> Dict[str, typing.Any]:
+        return {
+            "previous_revision": self.previous_revision,
+            "current_revision": self.current_revision,
+            "total": self.total.as_dict(),
+            "removed_files": self.removed_files,
+            "removed_bytes": self.removed_bytes,
+            "top": [growth.as_dict() for growth in self.top(top)],
+        }
+
+
+def format_size(size: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def verification_batches(
+    files: List[SnapshotFile],
+    max_files: int,
+    max_bytes: int,
+) -> Iterator[List[SnapshotFile]]:
+    batch: List[SnapshotFile] = []
+    batch_bytes = 0
+    for file in files:
+        if len(batch) > 0 and (
+            len(batch) >= max_files or batch_bytes + file.size > max_bytes
+        ):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(file)
+        batch_bytes += file.size
+    if len(batch) > 0:
+        yield batch
+
+
+def restore_pattern(path: str) -> str:
+    return f"i:^{re.escape(path)}$"
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def live_file_matches_snapshot(path: Path, snapshot_file: SnapshotFile) -> bool:
+    try:
+        stat = path.stat()
+    except OSError:
+        return False
+    modified_at = datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+    return (
+        stat.st_size == snapshot_file.size and modified_at == snapshot_file.modified_at
+    )
+
+
+@contextlib.contextmanager
+def temporary_restore_area(
+    repository_path: Path,
+    share_cache: bool = True,
+) -> Iterator[Path]:
+    # A throwaway repository sharing the storages and chunk cache of the real one
+    directory = Path(tempfile.mkdtemp(prefix="duplicacy-restore-"))
+    try:
+        preferences_directory = directory.joinpath(".duplicacy")
+        preferences_directory.mkdir()
+        with open(repository_path.joinpath(".duplicacy", "preferences"), "r") as file:
+            preferences = json.load(file)
+        for preference in preferences:
+            # Otherwise duplicacy would restore into the real repository
+            preference.pop("repository", None)
+        with open(preferences_directory.joinpath("preferences"), "w") as file:
+            json.dump(preferences, file)
+
+        cache_path = repository_path.joinpath(".duplicacy", "cache")
+        if share_cache and cache_path.is_dir():
+            preferences_directory.joinpath("cache").symlink_to(cache_path)
+        yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+# Per-chunk and per-file download lines duplicacy prints while restoring
+restore_downloaded_pattern = re.compile(r"\bDownloaded (?:chunk \d+|.+ \(\d+\)$)")
+
+
+def select_restore_drill_directories(
+    files: typing.Iterable[SnapshotFile],
+    byte_budget: int,
+    max_directories: int,
+) -> Dict[str, List[SnapshotFile]]:
+    directories: Dict[str, List[SnapshotFile]] = dict()
+    for file in files:
+        directory, _, _ = file.path.rpartition("/")
+        directories.setdefault(directory, []).append(file)
+    sizes = {
+        directory: sum(file.size for file in directory_files)
+        for directory, directory_files in directories.items()
+    }
+
+    # A random sample, so that drills over time cover different parts of the repository
+    candidates = list(directories)
+    random.shuffle(candidates)
+    selected: Dict[str, List[SnapshotFile]] = dict()
+    selected_bytes = 0
+    for directory in candidates:
+        if len(selected) >= max_directories:
+            break
+        if selected_bytes + sizes[directory] > byte_budget:
+            continue
+        selected[directory] = directories[directory]
+        selected_bytes += sizes[directory]
+    if len(selected) == 0 and len(directories) > 0:
+        # Every directory exceeds the budget, the smallest one still gets drilled
+        smallest = min(directories, key=lambda directory: sizes[directory])
+        selected[smallest] = directories[smallest]
+    return selected
+
+
+def restored_file_matches(
+    restored_path: Path,
+    live_path: Path,
+    snapshot_file: SnapshotFile,
+) -> bool:
+    try:
+        if restored_path.stat().st_size != snapshot_file.size:
+            return False
+    except OSError:
+        return False
+    if not live_file_matches_snapshot(live_path, snapshot_file):
+        # The live file changed since the backup, only its size can be compared
+        return True
+    return file_digest(restored_path) == file_digest(live_path)
+
+
+@dataclass
+class RestoreDrillResult:
+    revision: int
+    files: int
+    bytes: int
+    seconds: float = 0.0
+    time_to_first_byte: Optional[float] = None
+    verified: int = 0
+    mismatched: int = 0
+
+    @property
+    def throughput(self) -> float:
+        return self.bytes / max(self.seconds, 1e-9)
+
+    def describe(self) -> str:
+        time_to_first_byte = (
+            f"{self.time_to_first_byte:.1f}s"
+            if self.time_to_first_byte is not None
+            else "unknown"
+        )
+        return f"Restore drill of revision {self.revision} restored {self.files} files, {format_size(self.bytes)} in {self.seconds:.1f}s at {format_size(self.throughput)}/s, time to first byte {time_to_first_byte}. {self.verified} files verified, {self.mismatched} mismatched"
+
+    def as_dict(self) -> Dict[str, typing.Any]:
+        return {
+            "revision": self.revision,
+            "files": self.files,
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+            "throughput": self.throughput,
+            "time_to_first_byte": self.time_to_first_byte,
+            "verified": self.verified,
+            "mismatched": self.mismatched,
+        }
+
+
+@dataclass
+class RestoreDrillHistory:
+    path: Path
+
+    def last_drill_at(self) -> Optional[datetime]:
+        drills = self.__read()
+        if len(drills) == 0:
+            return None
+        return datetime.fromisoformat(drills[-1]["drilled_at"])
+
+    def record(self, result: RestoreDrillResult) -> None:
+        drills = self.__read() + [
+            {"drilled_at": datetime.now().isoformat(), **result.as_dict()}
+        ]
+        with open(self.path, "w") as history_file:
+            json.dump(drills[-restore_drill_history_length:], history_file, indent=2)
+
+    def __read(self) -> List[Dict[str, typing.Any]]:
+        try:
+            with open(self.path, "r") as history_file:
+                return typing.cast(List[Dict[str, typing.Any]], json.load(history_file))
+        except FileNotFoundError:
+            return []
+
+
+@dataclass
+class VerificationCoverage:
+    database_path: Path
+
+    def __post_init__(self) -> None:
+        self.__connection = sqlite3.connect(str(self.database_path))
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS coverage (path TEXT PRIMARY KEY, verified_at REAL)"
+        )
+        self.__connection.execute(
+            "CREATE TEMPORARY TABLE listing (path TEXT PRIMARY KEY, size INTEGER, modified_at TEXT, bucket INTEGER)"
+        )
+
+    def close(self) -> None:
+        self.__connection.commit()
+        self.__connection.close()
+
+    def load_listing(self, files: typing.Iterable[SnapshotFile]) -> None:
+        self.__connection.executemany(
+            "INSERT OR REPLACE INTO listing VALUES (?, ?, ?, ?)",
+            (
+                (file.path, file.size, file.modified_at, file.size.bit_length())
+                for file in files
+            ),
+        )
+        # Files that are gone from the latest revision don't need coverage anymore
+        self.__connection.execute(
+            "DELETE FROM coverage WHERE path NOT IN (SELECT path FROM listing)"
+        )
+        self.__connection.commit()
+
+    def select(
+        self,
+        byte_budget: int,
+        max_files: int,
+        overdue_before: float,
+    ) -> List[SnapshotFile]:
+        selected: List[SnapshotFile] = []
+        remaining_bytes = byte_budget
+        # Overdue files go first, then the budget is filled with a random sample
+        for overdue in [True, False]:
+            buckets = [
+                row[0]
+                for row in self.__connection.execute(
+                    "SELECT DISTINCT bucket FROM listing ORDER BY bucket"
+                )
+            ]
+            cursors = {
+                bucket: self.__connection.execute(
+                    "SELECT listing.path, size, modified_at FROM listing "
+                    "LEFT JOIN coverage ON coverage.path = listing.path "
+                    "WHERE bucket = ? AND (COALESCE(verified_at, 0) < ?) = ? "
+                    "ORDER BY COALESCE(verified_at, 0), random()",
+                    (bucket, overdue_before, overdue),
+                )
+                for bucket in buckets
+            }
+            # Round-robin over size buckets keeps the sample stratified by size
+            while len(cursors) > 0 and len(selected) < max_files:
+                for bucket, cursor in list(cursors.items()):
+                    row = cursor.fetchone()
+                    smallest_size_in_bucket = 1 << max(bucket - 1, 0)
+                    if row is None or smallest_size_in_bucket > remaining_bytes:
+                        del cursors[bucket]
+                        continue
+                    if row[1] > remaining_bytes or len(selected) >= max_files:
+                        continue
+                    selected.append(
+                        SnapshotFile(path=row[0], size=row[1], modified_at=row[2])
+                    )
+                    remaining_bytes -= row[1]
+        return selected
+
+    def mark_verified(self, paths: List[str], verified_at: float) -> None:
+        self.__connection.executemany(
+            "INSERT OR REPLACE INTO coverage VALUES (?, ?)",
+            ((path, verified_at) for path in paths),
+        )
+        self.__connection.commit()
+
+    def covered_fraction(self, verified_after: float) -> float:
+        covered, total = self.__connection.execute(
+            "SELECT COUNT(verified_at), COUNT(*) FROM listing "
+            "LEFT JOIN coverage ON coverage.path = listing.path AND verified_at >= ?",
+            (verified_after,),
+        ).fetchone()
+        if total == 0:
+            return 1.0
+        return typing.cast(float, covered / total)
+
+
+@dataclass
+class CachedChunk:
+    path: Path
+    size: int
+    accessed_at: float
+    modified_at: float
+
+    @property
+    def last_used_at(self) -> float:
+        return max(self.accessed_at, self.modified_at)
+
+
+@dataclass
+class CacheManager:
+    logger: Logger
+    cache_path: Path
+    byte_budget: Optional[int]
+
+    def __post_init__(self) -> None:
+        self.__phase_started_at = 0.0
+
+    def begin_phase(self) -> None:
+        self.__phase_started_at = time.time()
+
+    def end_phase(self, phase: str) -> None:
+        if self.byte_budget is None or not self.cache_path.is_dir():
+            return
+
+        try:
+            self.__report_and_evict(phase=phase, byte_budget=self.byte_budget)
+        except Exception as exception:
+            self.logger.error(f"Cache management failed: {exception}")
+
+    def __report_and_evict(self, phase: str, byte_budget: int) -> None:
+        total_bytes = 0
+        total_files = 0
+        chunks: List[CachedChunk] = []
+        for directory, _, file_names in os.walk(self.cache_path):
+            # Snapshot metadata outside of chunks directories is never evicted
+            is_chunks_directory = "chunks" in Path(directory).parts
+            for file_name in file_names:
+                path = Path(directory, file_name)
+                stat = path.stat()
+                total_bytes += stat.st_size
+                total_files += 1
+                if is_chunks_directory:
+                    chunks.append(
+                        CachedChunk(
+                            path=path,
+                            size=stat.st_size,
+                            accessed_at=stat.st_atime,
+                            modified_at=stat.st_mtime,
+                        )
+                    )
+
+        # Chunks written during the phase weren't in the cache yet, chunks only read were
+        added_chunks = len(
+            [chunk for chunk in chunks if chunk.modified_at >= self.__phase_started_at]
+        )
+        reused_chunks = len(
+            [
+                chunk
+                for chunk in chunks
+                if chunk.modified_at < self.__phase_started_at
+                and chunk.accessed_at >= self.__phase_started_at
+            ]
+        )
+        self.logger.info(
+            f"Cache after {phase}: {total_bytes / 1024**2:.1f} MB in {total_files} files, {reused_chunks} cached chunks read and {added_chunks} chunks added during the phase"
+        )
+        if total_bytes <= byte_budget:
+            return
+
+        evicted_bytes = 0
+        evicted_chunks = 0
+        for chunk in sorted(chunks, key=lambda chunk: chunk.last_used_at):
+            if total_bytes - evicted_bytes <= byte_budget:
+                break
+            chunk.path.unlink()
+            evicted_bytes += chunk.size
+            evicted_chunks += 1
+        self.logger.info(
+            f"Evicted {evicted_chunks} least recently used chunks, {evicted_bytes / 1024**2:.1f} MB, the cache is now {(total_bytes - evicted_bytes) / 1024**2:.1f} MB"
+        )
+
+
+@dataclass
+class Supervisor:
+    logger: Logger
+    commands: Commands
+    socket_path: Path
+    intervals: List[Dict[str, int]]
+
+    def __post_init__(self) -> None:
+        self.__run_requested = threading.Event()
+        self.__idle = threading.Event()
+        self.__idle.set()
+        self.__running = False
+        self.__next_fire_time: Optional[datetime] = None
+        self.__last_run_started_at: Optional[datetime] = None
+        self.__last_run_finished_at: Optional[datetime] = None
+
+    def serve(self) -> None:
+        self.logger.info(f"Starting supervisor with control socket {self.socket_path}")
+        threading.Thread(
+            target=self.__schedule,
+            name="scheduler",
+            daemon=True,
+        ).start()
+        signal.signal(signal.SIGTERM, self.__on_termination_signal)
+        signal.signal(signal.SIGINT, self.__on_termination_signal)
+
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        supervisor = self
+
+        class ControlRequestHandler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                command = self.rfile.readline().decode().strip()
+                response = supervisor.handle_command(command)
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+
+        with socketserver.ThreadingUnixStreamServer(
+            str(self.socket_path),
+            ControlRequestHandler,
+        ) as server:
+            os.chmod(self.socket_path, 0o600)
+            try:
+                server.serve_forever()
+            finally:
+                self.socket_path.unlink()
+
+    def __on_termination_signal(self, signal_number: int, frame: typing.Any) -> None:
+        self.logger.warning(
+            f"Received {signal.Signals(signal_number).name}, stopping the supervisor"
+        )
+        self.commands.cancel()
+        # Lets the run record its cancelled state before the process exits
+        self.__idle.wait(timeout=termination_grace_period + 5)
+        raise SystemExit(128 + signal_number)
+
+    def handle_command(self, command: str) -> Dict[str, typing.Any]:
+        if command == "status":
+            return self.__status()
+
+        self.logger.info(f"Received control command: {command}")
+        if command == "run":
+            self.__run_requested.set()
+        elif command == "cancel":
+            if self.__running:
+                self.commands.cancel()
+        elif command == "pause":
+            self.commands.pause()
+        elif command == "resume":
+            self.commands.resume()
+        else:
+            return {"error": f"Unknown command: {command}"}
+        return self.__status()
+
+    def __status(self) -> Dict[str, typing.Any]:
+        return {
+            "running": self.__running,
+            "paused": self.commands.paused,
+            "progress": self.commands.progress.as_dict() if self.__running else None,
+            "next_fire_time": optional_isoformat(self.__next_fire_time),
+            "last_run_started_at": optional_isoformat(self.__last_run_started_at),
+            "last_run_finished_at": optional_isoformat(self.__last_run_finished_at),
+        }
+
+    def __schedule(self) -> None:
+        self.__next_fire_time = self.__next_fire_time_after(datetime.now())
+        while True:
+            # Wake up at least every minute to tolerate sleep and clock changes
+            timeout = 60.0
+            if self.__next_fire_time is not None:
+                timeout = min(
+                    timeout,
+                    max(0.0, (self.__next_fire_time - datetime.now()).total_seconds()),
+                )
+            run_requested = self.__run_requested.wait(timeout=timeout)
+            now = datetime.now()
+            is_due = self.__next_fire_time is not None and now >= self.__next_fire_time
+            if not (run_requested or is_due):
+                continue
+
+            self.__run_requested.clear()
+            if is_due and not run_requested and self.commands.paused:
+                self.logger.info("Skipping scheduled run, the supervisor is paused")
+            else:
+                self.__run()
+            # Like launchd, fires that pass during a run are coalesced into one more run
+            self.__next_fire_time = self.__next_fire_time_after(now)
+
+    def __run(self) -> None:
+        self.__idle.clear()
+        self.__running = True
+        self.__last_run_started_at = datetime.now()
+        try:
+            run_phases(commands=self.commands)
+        except SystemExit:
+            self.logger.error("Run was aborted")
+        except Exception as exception:
+            self.logger.error(f"Run failed: {exception}")
+        finally:
+            self.__running = False
+            self.__last_run_finished_at = datetime.now()
+            self.__idle.set()
+
+    def __next_fire_time_after(self, moment: datetime) -> Optional[datetime]:
+        return next(
+            calendar_fire_times(
+                intervals=self.intervals,
+                start=moment,
+                end=moment + timedelta(days=366),
+            ),
+            None,
+        )
+
+
+def control(arguments: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        description="Control a running backup supervisor",
+    )
+    parser.add_argument(
+        "command",
+        choices=["status", "run", "cancel", "pause", "resume"],
+    )
+    parser.add_argument(
+        "--socket-path",
+        help="Path to the supervisor control socket",
+        default=supervisor_socket_path_env.get() or default_supervisor_socket_path,
+    )
+    args = parser.parse_args(arguments)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(args.socket_path)
+        connection.sendall(args.command.encode() + b"\n")
+        response = connection.makefile("rb").readline()
+    print(json.dumps(json.loads(response), indent=2))
+
+
+@dataclass
+class LogShipperCursor:
+    # The first line identifies a log file across rotations, unlike an inode which can be reused
+    head: str
+    offset: int
+
+
+@dataclass
+class LogShipper:
+    logger: Logger
+    log_path: Path
+    url: Optional[str]
+    batch_bytes: int
+    flush_interval: float
+    max_bytes_per_second: Optional[int]
+    json_lines: bool = False
+
+    def __post_init__(self) -> None:
+        self.__cursor_path = self.log_path.parent.joinpath("log_shipper.cursor.json")
+        self.__hostname = socket.gethostname()
+        self.__stopped = threading.Event()
+        self.__lock = threading.Lock()
+        self.__thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.url is None:
+            self.logger.info("Skipping log shipping")
+            return
+
+        self.__thread = threading.Thread(
+            target=self.__ship_periodically,
+            name="log-shipper",
+            daemon=True,
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        if self.__thread is None:
+            return
+
+        self.__stopped.set()
+        self.__thread.join()
+        self.__thread = None
+        self.__ship_safely()
+
+    def __ship_periodically(self) -> None:
+        while not self.__stopped.wait(self.flush_interval):
+            self.__ship_safely()
+
+    def __ship_safely(self) -> None:
+        try:
+            with self.__lock:
+                self.__ship_pending()
+        except Exception as exception:
+            # The cursor is left in place, the rest is shipped by the next attempt
+            self.logger.error(f"Log shipping failed: {exception}")
+
+    def __ship_pending(self) -> None:
+        with open(self.log_path, "rb") as log_file:
+            head = log_file.readline().decode(errors="replace")
+            cursor = self.__read_cursor(default_head=head)
+            if cursor.head != head:
+                # Finishes the log the cursor is in, then every log rotated after it
+                for rotated_log_path in self.__unshipped_rotated_log_paths(cursor):
+                    with gzip.open(rotated_log_path, "rb") as rotated_log:
+                        rotated_head = rotated_log.readline().decode(errors="replace")
+                        if rotated_head != cursor.head:
+                            cursor = LogShipperCursor(head=rotated_head, offset=0)
+                        self.__ship_from(
+                            log_file=rotated_log,  # type: ignore
+                            cursor=cursor,
+                        )
+                cursor = LogShipperCursor(head=head, offset=0)
+                self.__write_cursor(cursor)
+
+            self.__ship_from(log_file=log_file, cursor=cursor)
+
+    def __ship_from(
+        self,
+        log_file: typing.BinaryIO,
+        cursor: LogShipperCursor,
+    ) -> None:
+        log_file.seek(cursor.offset)
+        while True:
+            chunk = log_file.read(self.batch_bytes)
+            # Only complete lines are shipped, a partial line waits for the next flush
+            complete_length = chunk.rfind(b"\n") + 1
+            if complete_length == 0 and len(chunk) == self.batch_bytes:
+                # A line longer than a batch is shipped by itself once it's complete
+                chunk += log_file.readline()
+                if chunk.endswith(b"\n"):
+                    complete_length = len(chunk)
+            if complete_length == 0:
+                return
+
+            self.__send_batch(
+                lines=chunk[:complete_length].decode(errors="replace").splitlines(),
+                batch_id=f"{self.__hostname}:{zlib.crc32(cursor.head.encode()):08x}:{cursor.offset}",
+            )
+            cursor = LogShipperCursor(
+                head=cursor.head,
+                offset=cursor.offset + complete_length,
+            )
+            self.__write_cursor(cursor)
+            log_file.seek(cursor.offset)
+
+    def __send_batch(self, lines: List[str], batch_id: str) -> None:
+        payload = gzip.compress(
+            json.dumps(
+                {
+                    "host": self.__hostname,
+                    "log": self.log_path.name,
+                    "batch_id": batch_id,
+                    "lines": lines,
+                    "stats": parse_backup_stats(
+                        lines=lines,
+                        json_lines=self.json_lines,
+                    ),
+                }
+            ).encode()
+        )
+        request = Request(
+            url=self.url,  # type: ignore
+            data=payload,
+            headers={
+                "Content-Type": "application/json",
+                "Content-Encoding": "gzip",
+                # Lets the collector drop a batch resent after a crash before the cursor was saved
+                "Idempotency-Key": batch_id,
+            },
+            method="POST",
+        )
+        started_at = time.monotonic()
+        urlopen(request, timeout=healthcheck_connection_timeout).close()
+
+        if self.max_bytes_per_second is not None:
+            remaining = len(payload) / self.max_bytes_per_second - (
+                time.monotonic() - started_at
+            )
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def __unshipped_rotated_log_paths(self, cursor: LogShipperCursor) -> List[Path]:
+        rotated_log_paths = sorted(
+            self.log_path.parent.glob(self.log_path.name + ".*log.gz"),
+            key=lambda path: path.stat().st_mtime,
+        )
+        for index, rotated_log_path in enumerate(rotated_log_paths):
+            with gzip.open(rotated_log_path, "rb") as rotated_log:
+                if rotated_log.readline().decode(errors="replace") == cursor.head:
+                    return rotated_log_paths[index:]
+        # The collector deduplicates batches it already has by their Idempotency-Key
+        self.logger.warning(
+            "Couldn't find the log the shipping cursor points to, shipping all rotated logs"
+        )
+        return rotated_log_paths
+
+    def __read_cursor(self, default_head: str) -> LogShipperCursor:
+        if not self.__cursor_path.exists():
+            return LogShipperCursor(head=default_head, offset=0)
+        with open(self.__cursor_path, "r") as cursor_file:
+            cursor = json.load(cursor_file)
+        return LogShipperCursor(head=cursor["head"], offset=cursor["offset"])
+
+    def __write_cursor(self, cursor: LogShipperCursor) -> None:
+        temporary_path = self.__cursor_path.with_suffix(".tmp")
+        with open(temporary_path, "w") as cursor_file:
+            json.dump({"head": cursor.head, "offset": cursor.offset}, cursor_file)
+        os.replace(temporary_path, self.__cursor_path)
+
+
+# Summary lines of "duplicacy backup -stats", with or without the -log prefix
+backup_stats_pattern = re.compile(
+    r"(?:^|\s)(Files|File chunks|Metadata chunks|All chunks|Total running time): (.+)$"
+)
+
+
+def parse_backup_stats(lines: List[str], json_lines: bool = False) -> Dict[str, str]:
+    stats = dict()
+    for line in lines:
+        if json_lines:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            fields = event.get("fields") or dict()
+            if "stat" in fields:
+                stats[fields["stat"]] = fields["value"]
+                continue
+            line = str(event.get("message", ""))
+        match = backup_stats_pattern.search(line.rstrip())
+        if match is not None:
+            stats[match.group(1)] = match.group(2).strip()
+    return stats
+
+
 def show_alert(
     message: str,
     timeout: int = 60,
@@ -285,20 +2494,41 @@ def show_alert(
         print(f"Alert error: {e}")
 
 
-def create_rotating_logger(log_path: Path) -> Logger:
+def create_rotating_logger(
+    log_path: Path,
+    structured_log_path: Optional[Path] = None,
+    run_context: Optional[RunContext] = None,
+) -> Logger:
     logger = logging.getLogger()
-    rotating_file_handler = TimedRotatingFileHandler(
-        filename=log_path,
-        when="D",
-        interval=1,
-        backupCount=7,
-    )
+    rotating_file_handler = create_rotating_file_handler(log_path=log_path)
     rotating_file_handler.setFormatter(
         logging.Formatter(
             fmt="[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s",
             datefmt="%d/%b/%Y %H:%M:%S",
         )
     )
+    logger.addHandler(rotating_file_handler)
+
+    if structured_log_path is not None:
+        structured_file_handler = create_rotating_file_handler(
+            log_path=structured_log_path
+        )
+        structured_file_handler.setFormatter(
+            JsonLinesFormatter(run_context=run_context or RunContext())
+        )
+        logger.addHandler(structured_file_handler)
+
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def create_rotating_file_handler(log_path: Path) -> TimedRotatingFileHandler:
+    rotating_file_handler = TimedRotatingFileHandler(
+        filename=log_path,
+        when="D",
+        interval=1,
+        backupCount=7,
+    )
 
     def namer(name: str) -> str:
         return name + "log.gz"
@@ -312,9 +2542,131 @@ def create_rotating_logger(log_path: Path) -> Logger:
         os.remove(source)
 
     rotating_file_handler.rotator = rotator
-    logger.addHandler(rotating_file_handler)
-    logger.setLevel(logging.DEBUG)
-    return logger
+    return rotating_file_handler
+
+
+# "<yyyy-mm-dd hh:mm:ss.mmm> <LEVEL> <CODE> <message>" as printed by "duplicacy -log"
+duplicacy_log_line_pattern = re.compile(
+    r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3}) ([A-Z]+) ([A-Z_]+) (.*)$"
+)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def __init__(self, run_context: RunContext):
+        super().__init__()
+        self.__run_context = run_context
+        self.__encode = json.JSONEncoder(
+            ensure_ascii=False,
+            check_circular=False,
+            separators=(",", ":"),
+        ).encode
+
+    def format(self, record: logging.LogRecord) -> str:
+        # Only the fields below are read, the record isn't introspected otherwise
+        if isinstance(record.msg, str) and not record.args:
+            message = record.msg
+        else:
+            message = record.getMessage()
+        message = message.rstrip("\n")
+        stream = record.__dict__.get("stream", "script")
+        monotonic = record.__dict__.get("monotonic")
+        if monotonic is None:
+            # Formatting can lag behind the event, for example while another handler rotates its log
+            monotonic = time.monotonic() - max(time.time() - record.created, 0.0)
+        event: Dict[str, typing.Any] = {
+            "time": record.created,
+            "monotonic": monotonic,
+            "run_id": self.__run_context.run_id,
+            "phase": self.__run_context.phase,
+            "stream": stream,
+            "level": record.levelname,
+            "message": message,
+        }
+        hook = record.__dict__.get("hook")
+        if hook is not None:
+            event["hook"] = hook
+        if stream == "script":
+            fields = record.__dict__.get("fields")
+        else:
+            fields = parse_duplicacy_log_line(message)
+        if fields is not None:
+            event["fields"] = fields
+        return self.__encode(event)
+
+
+def parse_duplicacy_log_line(line: str) -> Optional[Dict[str, typing.Any]]:
+    match = duplicacy_log_line_pattern.match(line)
+    if match is None:
+        return None
+    fields: Dict[str, typing.Any] = {
+        "time": match.group(1),
+        "level": match.group(2),
+        "code": match.group(3),
+    }
+    message = match.group(4)
+    if fields["code"] == "BACKUP_STATS":
+        key, _, value = message.partition(":")
+        fields["stat"] = key.strip()
+        fields["value"] = value.strip()
+    percent = progress_percent_pattern.search(message)
+    if percent is not None:
+        fields["percent"] = float(percent.group(1))
+    return fields
+
+
+def calendar_interval_matches(interval: Dict[str, int], moment: datetime) -> bool:
+    # Same keys as StartCalendarInterval in launchd.plist; a missing key is a wildcard
+    fields = {
+        "Minute": moment.minute,
+        "Hour": moment.hour,
+        "Day": moment.day,
+        "Weekday": moment.isoweekday() % 7,
+        "Month": moment.month,
+    }
+    for key, value in interval.items():
+        if key == "Weekday":
+            value %= 7
+        if fields[key] != value:
+            return False
+    return True
+
+
+def calendar_fire_times(
+    intervals: List[Dict[str, int]],
+    start: datetime,
+    end: datetime,
+) -> Iterator[datetime]:
+    moment = start.replace(second=0, microsecond=0)
+    if moment < start:
+        moment += timedelta(minutes=1)
+    while moment < end:
+        if any(calendar_interval_matches(interval, moment) for interval in intervals):
+            yield moment
+        moment += timedelta(minutes=1)
+
+
+def send_signal(process: subprocess.Popen[bytes], signal_to_send: int) -> None:
+    if process.returncode is not None:
+        return
+    try:
+        if os.getpgid(process.pid) == process.pid:
+            os.killpg(process.pid, signal_to_send)
+            return
+    except ProcessLookupError:
+        return
+    process.send_signal(signal_to_send)
+
+
+def optional_isoformat(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat()
+
+
+def optional_int(value: Optional[str]) -> Optional[int]:
+    if value is None:
+        return None
+    return int(value)
 
 
 T = typing.TypeVar("T")
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+
+from __future__ import annotations
+
+import argparse
+import statistics
+from datetime import datetime, timedelta
+from pathlib import Path
+from random import Random
+from typing import Dict, List, Tuple
+
+from install import logging_directory, print_intervals
+from lib.schedule_simulator import (
+    DurationSampler,
+    HistoricalDurationsParser,
+    ScheduleSimulationReport,
+    ScheduleSimulator,
+    ScheduleSimulatorException,
+    empirical_sampler,
+    lognormal_sampler,
+)
+from lib.start_calendar_interval import StartCalendarInterval
+
+
+def simulate() -> None:
+    parser = argparse.ArgumentParser(
+        description="Simulate scheduled runs to predict overlaps and window overruns"
+    )
+    parser.add_argument(
+        "--start-calendar-interval",
+        help="Schedule in the same CSV format as install.py: '<Minute>,<Hour>,<Day>,<Weekday>,<Month>'",
+        action="extend",
+        nargs="+",
+        type=str,
+        default=[],
+    )
+    parser.add_argument(
+        "--log-path",
+        help="Directory with duplicacy.log files to take historical phase durations from",
+        default=str(logging_directory),
+    )
+    parser.add_argument(
+        "--duration",
+        help="Phase duration distribution in minutes as '<phase>=<mean>[,<stddev>]', for example 'backup=45,15'. Overrides historical durations for the phase",
+        action="extend",
+        nargs="+",
+        type=str,
+        default=[],
+    )
+    parser.add_argument(
+        "--weeks",
+        help="Number of weeks to simulate",
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        "--trials",
+        help="Number of simulated schedules to average over",
+        type=int,
+        default=1000,
+    )
+    parser.add_argument(
+        "--business-hours",
+        help="Business hours as '<first hour>-<last hour>'",
+        default="9-18",
+    )
+    parser.add_argument(
+        "--business-weekdays",
+        help="Business weekdays as '<first>-<last>' using launchd numbering (0 is Sunday)",
+        default="1-5",
+    )
+    parser.add_argument(
+        "--seed",
+        help="Random seed for reproducible results",
+        type=int,
+    )
+    args = parser.parse_args()
+
+    intervals = [
+        StartCalendarInterval.from_csv(interval)
+        for interval in (args.start_calendar_interval or ["0,1,,,"])
+    ]
+    print_intervals(intervals=intervals)
+
+    phase_samplers = historical_samplers(
+        log_directory=Path(args.log_path),
+        with_overrides=len(args.duration) > 0,
+    )
+    for value in args.duration:
+        phase, sampler = parse_duration(value)
+        phase_samplers[phase] = sampler
+    if len(phase_samplers) == 0:
+        print("No phase durations available. Specify --duration or --log-path")
+        raise ScheduleSimulatorException()
+
+    report = ScheduleSimulator(
+        intervals=intervals,
+        phase_samplers=phase_samplers,
+        business_hours=parse_hours(args.business_hours),
+        business_weekdays=list(parse_range(args.business_weekdays)),
+    ).simulate(
+        start=datetime.now().replace(second=0, microsecond=0),
+        weeks=args.weeks,
+        trials=args.trials,
+        random=Random(args.seed),
+    )
+    print_report(report=report, business_hours=args.business_hours)
+
+
+def historical_samplers(
+    log_directory: Path,
+    with_overrides: bool,
+) -> Dict[str, DurationSampler]:
+    try:
+        durations = HistoricalDurationsParser().parse(log_directory=log_directory)
+    except ScheduleSimulatorException:
+        if with_overrides:
+            return dict()
+        raise
+
+    samplers: Dict[str, DurationSampler] = dict()
+    for phase, samples in durations.items():
+        print(
+            f"Using {len(samples)} historical {phase} durations, median {format_duration(statistics.median(samples))}"
+        )
+        samplers[phase] = empirical_sampler(samples)
+    return samplers
+
+
+def parse_duration(value: str) -> Tuple[str, DurationSampler]:
+    phase, separator, distribution = value.partition("=")
+    if len(separator) == 0:
+        print(f"Incorrect value specified for --duration: {value}")
+        raise ScheduleSimulatorException()
+    mean, _, stddev = distribution.partition(",")
+    return phase, lognormal_sampler(
+        mean=float(mean) * 60,
+        stddev=float(stddev or 0) * 60,
+    )
+
+
+def parse_hours(value: str) -> range:
+    first, _, last = value.partition("-")
+    return range(int(first), int(last))
+
+
+def parse_range(value: str) -> range:
+    first, _, last = value.partition("-")
+    return range(int(first), int(last or first) + 1)
+
+
+def print_report(report: ScheduleSimulationReport, business_hours: str) -> None:
+    print(
+        f"\nSimulated {report.trials} x {report.weeks} weeks, {report.fires_per_trial} scheduled fires per trial:"
+    )
+    print(f"  Run duration median: {format_duration(median(report.durations))}")
+    print(f"  Run duration p95: {format_duration(percentile(report.durations, 95))}")
+    print(f"  Overlapping fires per week: {report.overlaps_per_week:.2f}")
+    print(
+        f"  Delayed runs: {len(report.queue_delays) / max(report.runs, 1):.1%}, queueing delay median {format_duration(median(report.queue_delays))}, p95 {format_duration(percentile(report.queue_delays, 95))}"
+    )
+    print(
+        f"  Probability a run is still going at the next fire: {report.probability_running_at_next_fire:.1%}"
+    )
+    print(
+        f"  Probability a run extends into business hours ({business_hours}): {report.probability_into_business_hours:.1%}"
+    )
+    print()
+
+
+def median(values: List[float]) -> float:
+    if len(values) == 0:
+        return 0.0
+    return statistics.median(values)
+
+
+def percentile(values: List[float], percent: int) -> float:
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, len(ordered) * percent // 100)]
+
+
+def format_duration(seconds: float) -> str:
+    return str(timedelta(seconds=round(seconds)))
+
+
+if __name__ == "__main__":
+    simulate()
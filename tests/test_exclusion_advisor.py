@@ -0,0 +1,142 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from typing import Dict, List
+
+from lib.exclusion_advisor import (
+    DirectoryUsage,
+    DuplicacyFiltersMerger,
+    ExclusionAdvisor,
+    ExclusionCandidate,
+)
+
+day = 24 * 60 * 60
+
+
+class ExclusionAdvisorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.repository_path = Path(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def write(self, path: str, size: int, age_days: float = 30) -> None:
+        file_path = self.repository_path.joinpath(path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(b"x" * size)
+        modified_at = time.time() - age_days * day
+        os.utime(file_path, (modified_at, modified_at))
+
+    def advise(self) -> Dict[str, ExclusionCandidate]:
+        advice = ExclusionAdvisor(
+            repository_path=self.repository_path,
+            churn_window_seconds=7 * day,
+            churn_ratio_threshold=0.5,
+            churn_min_bytes=100,
+            workers=4,
+        ).advise()
+        self.total = advice.total
+        return {candidate.path.as_posix(): candidate for candidate in advice.candidates}
+
+    def test_finds_regenerable_directories_at_any_depth(self) -> None:
+        self.write(".duplicacy/preferences", 10)
+        self.write("top.txt", 10)
+        self.write("node_modules/left-pad/index.js", 20)
+        self.write("Users/me/app/package.json", 10)
+        self.write("Users/me/app/build/bundle.js", 300)
+        self.write("Users/me/app/node_modules/a/index.js", 400)
+        self.write("Users/me/app/node_modules/a/node_modules/b/index.js", 500)
+        self.write("Users/me/notes/build/notes.txt", 40)
+
+        candidates = self.advise()
+
+        self.assertEqual(
+            {
+                "node_modules": "regenerable node_modules",
+                "Users/me/app/build": "regenerable build next to package.json",
+                "Users/me/app/node_modules": "regenerable node_modules",
+            },
+            {path: candidate.reason for path, candidate in candidates.items()},
+        )
+        self.assertEqual(
+            DirectoryUsage(files=2, bytes=900),
+            self.without_scan_time(candidates["Users/me/app/node_modules"].usage),
+        )
+        self.assertEqual(
+            DirectoryUsage(files=7, bytes=1280),
+            self.without_scan_time(self.total),
+        )
+
+    def test_finds_high_churn_directories_outside_regenerable_ones(self) -> None:
+        self.write("Users/me/logs/today.log", 900, age_days=1)
+        self.write("Users/me/logs/archive/old.log", 100)
+        self.write("Users/me/photos/old.jpg", 5000)
+        self.write("Users/me/photos/new.jpg", 10, age_days=1)
+        self.write("Users/me/.cache/tmp/blob", 1000, age_days=1)
+
+        candidates = self.advise()
+
+        self.assertEqual(["Users/me/.cache", "Users/me/logs"], sorted(candidates))
+        self.assertFalse(candidates["Users/me/logs"].regenerable)
+        self.assertEqual(900, candidates["Users/me/logs"].usage.churned_bytes)
+
+    def without_scan_time(self, usage: DirectoryUsage) -> DirectoryUsage:
+        return DirectoryUsage(
+            files=usage.files,
+            bytes=usage.bytes,
+            churned_bytes=usage.churned_bytes,
+        )
+
+
+class DuplicacyFiltersMergerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.filters_path = Path(self.directory.name).joinpath("filters")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def merge(self, paths: List[str]) -> List[str]:
+        return DuplicacyFiltersMerger().merge(
+            filters_path=self.filters_path,
+            candidates=[
+                ExclusionCandidate(
+                    path=Path(path),
+                    reason="regenerable",
+                    usage=DirectoryUsage(),
+                    regenerable=True,
+                )
+                for path in paths
+            ],
+        )
+
+    def test_creates_filters(self) -> None:
+        self.assertEqual(["-node_modules/"], self.merge(["node_modules"]))
+
+        self.assertEqual(
+            "# Added by advise_exclusions.py\n-node_modules/\n",
+            self.filters_path.read_text(),
+        )
+
+    def test_inserts_exclusions_before_first_pattern(self) -> None:
+        self.filters_path.write_text("# Mine\n\n-*.tmp\n-Downloads/\n")
+
+        added = self.merge(["Downloads", "app/build"])
+
+        self.assertEqual(["-app/build/"], added)
+        self.assertEqual(
+            "# Mine\n\n# Added by advise_exclusions.py\n-app/build/\n-*.tmp\n-Downloads/\n",
+            self.filters_path.read_text(),
+        )
+        self.assertEqual([], self.merge(["app/build"]))
+
+    def test_refuses_to_merge_with_include_patterns(self) -> None:
+        for include_pattern in ["+Documents/*", "i:^Projects/"]:
+            filters = f"{include_pattern}\n-*\n"
+            self.filters_path.write_text(filters)
+
+            self.assertEqual([], self.merge(["node_modules"]))
+            self.assertEqual(filters, self.filters_path.read_text())
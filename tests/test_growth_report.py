@@ -0,0 +1,70 @@
+import unittest
+
+from run_backup import DirectoryGrowth, GrowthReport, SnapshotFile, format_size
+
+
+class GrowthReportTest(unittest.TestCase):
+    def test_compares_revisions_by_directory(self) -> None:
+        report = GrowthReport(previous_revision=1, current_revision=2)
+        report.load_previous(
+            [
+                SnapshotFile("docs/a.txt", 100, "2026-10-18", "a1"),
+                SnapshotFile("docs/b.txt", 200, "2026-10-18", "b1"),
+                SnapshotFile("photos/2026/c.jpg", 300, "2026-10-18", "c1"),
+                SnapshotFile("top.txt", 400, "2026-10-18", "t1"),
+            ]
+        )
+
+        report.compare(
+            [
+                SnapshotFile("docs/a.txt", 100, "2026-10-18", "a1"),
+                SnapshotFile("docs/b.txt", 250, "2026-10-19", "b2"),
+                SnapshotFile("photos/2026/10/d.jpg", 1000, "2026-10-19", "d1"),
+                SnapshotFile("new.txt", 5, "2026-10-19", "n1"),
+            ],
+            depth=2,
+        )
+
+        self.assertEqual(
+            DirectoryGrowth(
+                directory=".",
+                new_files=2,
+                new_bytes=1005,
+                changed_files=1,
+                changed_bytes=250,
+            ),
+            report.total,
+        )
+        self.assertEqual((2, 700), (report.removed_files, report.removed_bytes))
+        self.assertEqual(
+            [
+                DirectoryGrowth("photos/2026", new_files=1, new_bytes=1000),
+                DirectoryGrowth("docs", changed_files=1, changed_bytes=250),
+                DirectoryGrowth(".", new_files=1, new_bytes=5),
+            ],
+            report.top(3),
+        )
+        self.assertEqual(2, len(report.top(2)))
+
+    def test_counts_everything_as_new_without_previous_revision(self) -> None:
+        report = GrowthReport(previous_revision=0, current_revision=1)
+
+        report.compare([SnapshotFile("a/b/c/d.txt", 2048, "2026-10-19")], depth=1)
+
+        self.assertEqual(
+            {"a": DirectoryGrowth("a", new_files=1, new_bytes=2048)},
+            report.directories,
+        )
+        self.assertEqual(
+            "Revision 1 added 1 files, 2.0 KB and changed 0 files, 0.0 B since revision 0. 0 files, 0.0 B were removed\n"
+            "  a: 2.0 KB (1 new, 0 changed files)",
+            report.summary(top=5),
+        )
+
+
+class FormatSizeTest(unittest.TestCase):
+    def test_formats_with_binary_units(self) -> None:
+        self.assertEqual("512.0 B", format_size(512))
+        self.assertEqual("1.5 KB", format_size(1536))
+        self.assertEqual("3.0 GB", format_size(3 * 1024**3))
+        self.assertEqual("2048.0 TB", format_size(2 * 1024**5))
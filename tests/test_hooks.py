@@ -0,0 +1,106 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any
+
+from run_backup import Hook, HookConfigurationException, read_hooks
+
+
+class ReadHooksTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.hooks_path = Path(self.directory.name).joinpath("hooks.json")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def write(self, configuration: Any) -> None:
+        self.hooks_path.write_text(json.dumps(configuration))
+
+    def test_reads_hooks_of_stage(self) -> None:
+        self.write(
+            {
+                "before_backup": [
+                    {"name": "snapshot", "command": "tmutil localsnapshot"},
+                    {
+                        "name": "dump",
+                        "command": ["pg_dump", "app"],
+                        "timeout": 60,
+                        "depends_on": ["snapshot"],
+                    },
+                ],
+                "after_backup": [{"name": "cleanup", "command": "true"}],
+            }
+        )
+
+        self.assertEqual(
+            [
+                Hook(
+                    name="snapshot",
+                    command=["/bin/sh", "-c", "tmutil localsnapshot"],
+                ),
+                Hook(
+                    name="dump",
+                    command=["pg_dump", "app"],
+                    timeout=60,
+                    depends_on=["snapshot"],
+                ),
+            ],
+            read_hooks(self.hooks_path, "before_backup"),
+        )
+
+    def test_rejects_dependency_cycle(self) -> None:
+        self.write(
+            {
+                "before_backup": [
+                    {"name": "first", "command": "true"},
+                    {"name": "second", "command": "true", "depends_on": ["third"]},
+                    {"name": "third", "command": "true", "depends_on": ["second"]},
+                ]
+            }
+        )
+
+        with self.assertRaisesRegex(
+            HookConfigurationException, "Dependency cycle.*: second, third$"
+        ):
+            read_hooks(self.hooks_path, "before_backup")
+
+    def test_rejects_self_dependency(self) -> None:
+        self.write(
+            {"after_backup": [{"name": "a", "command": "true", "depends_on": ["a"]}]}
+        )
+
+        with self.assertRaisesRegex(HookConfigurationException, "Dependency cycle"):
+            read_hooks(self.hooks_path, "after_backup")
+
+    def test_rejects_dependency_on_other_stage(self) -> None:
+        self.write(
+            {
+                "before_backup": [{"name": "snapshot", "command": "true"}],
+                "after_backup": [
+                    {"name": "cleanup", "command": "true", "depends_on": ["snapshot"]}
+                ],
+            }
+        )
+
+        with self.assertRaisesRegex(
+            HookConfigurationException, "cleanup depends on snapshot"
+        ):
+            read_hooks(self.hooks_path, "after_backup")
+
+    def test_rejects_duplicate_names_and_unknown_stages(self) -> None:
+        self.write(
+            {
+                "before_backup": [
+                    {"name": "a", "command": "true"},
+                    {"name": "a", "command": "true"},
+                ]
+            }
+        )
+        with self.assertRaisesRegex(HookConfigurationException, "must be unique"):
+            read_hooks(self.hooks_path, "before_backup")
+
+        self.write({"during_backup": []})
+        with self.assertRaisesRegex(HookConfigurationException, "Unknown hook stages"):
+            read_hooks(self.hooks_path, "before_backup")
@@ -0,0 +1,70 @@
+import json
+import logging
+import time
+import unittest
+from typing import Any, Dict
+
+from run_backup import JsonLinesFormatter, RunContext
+
+
+class JsonLinesFormatterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.run_context = RunContext()
+        self.run_context.phase = "Backup"
+        self.formatter = JsonLinesFormatter(run_context=self.run_context)
+
+    def format(self, record: logging.LogRecord) -> Dict[str, Any]:
+        return json.loads(self.formatter.format(record))  # type: ignore
+
+    def record(self, msg: Any, *args: Any, **extra: Any) -> logging.LogRecord:
+        record = logging.LogRecord(
+            name="test",
+            level=logging.INFO,
+            pathname=__file__,
+            lineno=1,
+            msg=msg,
+            args=args or None,
+            exc_info=None,
+        )
+        record.__dict__.update(extra)
+        return record
+
+    def test_formats_percent_style_records(self) -> None:
+        event = self.format(self.record("value %s of %d", "a", 2))
+
+        self.assertEqual("value a of 2", event["message"])
+
+    def test_keeps_messages_without_arguments_verbatim(self) -> None:
+        self.assertEqual(
+            "Uploaded 50% (%s)",
+            self.format(self.record("Uploaded 50% (%s)"))["message"],
+        )
+        self.assertEqual("12", self.format(self.record(12))["message"])
+
+    def test_takes_monotonic_time_of_the_event(self) -> None:
+        self.assertEqual(
+            42.0, self.format(self.record("line", monotonic=42.0))["monotonic"]
+        )
+
+        record = self.record("late")
+        time.sleep(0.2)
+        event = self.format(record)
+
+        self.assertLess(event["monotonic"], time.monotonic() - 0.15)
+
+    def test_parses_duplicacy_output(self) -> None:
+        event = self.format(
+            self.record(
+                "2026-10-19 01:00:00.123 INFO BACKUP_STATS Files: 10 total\n",
+                stream="stdout",
+                hook=None,
+            )
+        )
+
+        self.assertEqual("Backup", event["phase"])
+        self.assertEqual("stdout", event["stream"])
+        self.assertNotIn("hook", event)
+        self.assertEqual(
+            {"stat": "Files", "value": "10 total", "code": "BACKUP_STATS"},
+            {key: event["fields"][key] for key in ["stat", "value", "code"]},
+        )
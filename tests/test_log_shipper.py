@@ -0,0 +1,204 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Any, Dict, List
+
+from run_backup import LogShipper, parse_backup_stats
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.server.failing:  # type: ignore
+            self.send_response(503)
+            self.end_headers()
+            return
+        batch = json.loads(gzip.decompress(body))
+        batch["idempotency_key"] = self.headers["Idempotency-Key"]
+        self.server.batches.append(batch)  # type: ignore
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class LogShipperTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = Path(tempfile.mkdtemp())
+        self.log_path = self.directory.joinpath("duplicacy.log")
+        self.server = HTTPServer(("127.0.0.1", 0), CollectorHandler)
+        self.server.batches = []  # type: ignore
+        self.server.failing = False  # type: ignore
+        self.rotations = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def ship(self, batch_bytes: int = 1024) -> List[Dict[str, Any]]:
+        self.server.batches = []  # type: ignore
+        shipper = LogShipper(
+            logger=logging.getLogger("test"),
+            log_path=self.log_path,
+            url=f"http://127.0.0.1:{self.server.server_port}",
+            batch_bytes=batch_bytes,
+            flush_interval=3600,
+            max_bytes_per_second=None,
+        )
+        # Stopping ships whatever is pending
+        shipper.start()
+        shipper.stop()
+        return self.server.batches  # type: ignore
+
+    def append(self, text: str) -> None:
+        with open(self.log_path, "a") as log_file:
+            log_file.write(text)
+
+    def rotate(self, new_text: str) -> None:
+        self.rotations += 1
+        rotated_log_path = self.directory.joinpath(
+            f"duplicacy.log.2026-10-{self.rotations:02}log.gz"
+        )
+        with open(self.log_path, "rb") as log_file, gzip.open(
+            rotated_log_path, "wb"
+        ) as rotated_log:
+            shutil.copyfileobj(log_file, rotated_log)
+        # Rotated logs are ordered by modification time
+        os.utime(rotated_log_path, (self.rotations, self.rotations))
+        self.log_path.write_text(new_text)
+
+    def cursor(self) -> Dict[str, Any]:
+        with open(self.directory.joinpath("log_shipper.cursor.json")) as cursor_file:
+            return json.load(cursor_file)  # type: ignore
+
+    def test_ships_complete_lines_and_advances_cursor(self) -> None:
+        self.append("first\nsecond\nparti")
+
+        batches = self.ship()
+
+        self.assertEqual([["first", "second"]], [batch["lines"] for batch in batches])
+        self.assertEqual({"head": "first\n", "offset": 13}, self.cursor())
+
+        self.append("al\n")
+
+        batches = self.ship()
+
+        self.assertEqual([["partial"]], [batch["lines"] for batch in batches])
+        self.assertEqual(21, self.cursor()["offset"])
+        self.assertEqual([], self.ship())
+
+    def test_splits_batches_and_keys_them_by_offset(self) -> None:
+        self.append("one\ntwo\nthree\n")
+
+        batches = self.ship(batch_bytes=8)
+
+        self.assertEqual(
+            [["one", "two"], ["three"]], [batch["lines"] for batch in batches]
+        )
+        keys = [batch["idempotency_key"] for batch in batches]
+        self.assertEqual(keys, [batch["batch_id"] for batch in batches])
+        self.assertTrue(keys[0].endswith(":0"))
+        self.assertTrue(keys[1].endswith(":8"))
+
+    def test_ships_line_longer_than_batch_by_itself(self) -> None:
+        long_line = "x" * 20
+        self.append(f"head\n{long_line}\ntail\n")
+
+        batches = self.ship(batch_bytes=8)
+
+        self.assertEqual(
+            [["head"], [long_line], ["tail"]], [batch["lines"] for batch in batches]
+        )
+        self.assertEqual(31, self.cursor()["offset"])
+
+    def test_finishes_rotated_log_before_new_one(self) -> None:
+        self.append("old head\nshipped\n")
+        self.ship()
+        self.append("not shipped\n")
+        self.rotate("new head\nnew line\n")
+
+        batches = self.ship()
+
+        self.assertEqual(
+            [["not shipped"], ["new head", "new line"]],
+            [batch["lines"] for batch in batches],
+        )
+        self.assertEqual({"head": "new head\n", "offset": 18}, self.cursor())
+
+    def test_ships_log_left_unshipped_by_failed_flush_after_rotation(self) -> None:
+        self.append("run 1\n")
+        self.ship()
+        self.rotate("run 2\n")
+        self.server.failing = True  # type: ignore
+        self.ship()
+        self.assertEqual({"head": "run 2\n", "offset": 0}, self.cursor())
+        self.server.failing = False  # type: ignore
+        self.rotate("run 3\n")
+
+        batches = self.ship()
+
+        self.assertEqual([["run 2"], ["run 3"]], [batch["lines"] for batch in batches])
+
+    def test_ships_every_log_rotated_while_collector_was_down(self) -> None:
+        self.append("run 1\nshipped\n")
+        self.ship()
+        self.append("not shipped\n")
+        self.server.failing = True  # type: ignore
+        self.rotate("run 2\n")
+        self.ship()
+        self.rotate("run 3\n")
+        self.ship()
+        self.server.failing = False  # type: ignore
+
+        batches = self.ship()
+
+        self.assertEqual(
+            [["not shipped"], ["run 2"], ["run 3"]],
+            [batch["lines"] for batch in batches],
+        )
+        self.assertEqual({"head": "run 3\n", "offset": 6}, self.cursor())
+        self.assertEqual([], self.ship())
+
+
+class ParseBackupStatsTest(unittest.TestCase):
+    def test_parses_plain_log_lines(self) -> None:
+        lines = [
+            "2026-10-19 01:00:00,000 INFO [run_backup.py:100] Files: 12 total, 3.4M bytes; 2 new, 1.2K bytes",
+            "2026-10-19 01:00:00,000 INFO [run_backup.py:100] Total running time: 00:00:05",
+            "2026-10-19 01:00:00,000 INFO [run_backup.py:100] Uploaded chunk 3 size 1024",
+        ]
+
+        self.assertEqual(
+            {
+                "Files": "12 total, 3.4M bytes; 2 new, 1.2K bytes",
+                "Total running time": "00:00:05",
+            },
+            parse_backup_stats(lines),
+        )
+
+    def test_parses_json_lines(self) -> None:
+        lines = [
+            json.dumps({"message": "All chunks: 8 total", "fields": {}}),
+            json.dumps(
+                {
+                    "message": "Files: 12 total",
+                    "fields": {"stat": "Files", "value": "12 total"},
+                }
+            ),
+            "not json",
+        ]
+
+        self.assertEqual(
+            {"All chunks": "8 total", "Files": "12 total"},
+            parse_backup_stats(lines, json_lines=True),
+        )
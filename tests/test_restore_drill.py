@@ -0,0 +1,98 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+
+from run_backup import (
+    RestoreDrillHistory,
+    RestoreDrillResult,
+    SnapshotFile,
+    restore_drill_history_length,
+    select_restore_drill_directories,
+)
+
+
+def snapshot_file(path: str, size: int) -> SnapshotFile:
+    return SnapshotFile(path=path, size=size, modified_at="2026-10-19")
+
+
+class SelectRestoreDrillDirectoriesTest(unittest.TestCase):
+    files: List[SnapshotFile] = [
+        snapshot_file("top.txt", 10),
+        snapshot_file("docs/a.txt", 100),
+        snapshot_file("docs/b.txt", 200),
+        snapshot_file("docs/nested/c.txt", 1000),
+        snapshot_file("photos/d.jpg", 5000),
+    ]
+
+    def test_groups_files_by_parent_directory(self) -> None:
+        selected = select_restore_drill_directories(
+            self.files, byte_budget=10**6, max_directories=10
+        )
+
+        self.assertEqual(
+            {
+                "": ["top.txt"],
+                "docs": ["docs/a.txt", "docs/b.txt"],
+                "docs/nested": ["docs/nested/c.txt"],
+                "photos": ["photos/d.jpg"],
+            },
+            {
+                directory: [file.path for file in files]
+                for directory, files in selected.items()
+            },
+        )
+
+    def test_stays_within_byte_budget_and_directory_limit(self) -> None:
+        for _ in range(20):
+            selected = select_restore_drill_directories(
+                self.files, byte_budget=1500, max_directories=2
+            )
+
+            self.assertLessEqual(len(selected), 2)
+            self.assertNotIn("photos", selected)
+            self.assertLessEqual(
+                sum(file.size for files in selected.values() for file in files), 1500
+            )
+
+    def test_drills_smallest_directory_when_all_exceed_budget(self) -> None:
+        selected = select_restore_drill_directories(
+            self.files[1:], byte_budget=50, max_directories=5
+        )
+
+        self.assertEqual(["docs"], list(selected))
+
+    def test_selects_nothing_from_empty_revision(self) -> None:
+        self.assertEqual(
+            {}, select_restore_drill_directories([], byte_budget=50, max_directories=5)
+        )
+
+
+class RestoreDrillHistoryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.history = RestoreDrillHistory(
+            path=Path(self.directory.name).joinpath("restore_drills.json")
+        )
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_has_no_last_drill_without_history(self) -> None:
+        self.assertIsNone(self.history.last_drill_at())
+
+    def test_records_drills_up_to_history_length(self) -> None:
+        for revision in range(restore_drill_history_length + 5):
+            self.history.record(
+                RestoreDrillResult(revision=revision, files=1, bytes=1024, seconds=2)
+            )
+
+        with open(self.history.path) as history_file:
+            drills = json.load(history_file)
+        self.assertEqual(restore_drill_history_length, len(drills))
+        self.assertEqual(5, drills[0]["revision"])
+        self.assertEqual(512, drills[-1]["throughput"])
+        last_drill_at = self.history.last_drill_at()
+        assert last_drill_at is not None
+        self.assertEqual(drills[-1]["drilled_at"], last_drill_at.isoformat())
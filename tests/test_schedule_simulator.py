@@ -0,0 +1,153 @@
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from random import Random
+from typing import Dict, List
+
+from lib.schedule_simulator import (
+    HistoricalDurationsParser,
+    ScheduleSimulator,
+    ScheduleSimulatorException,
+    lognormal_sampler,
+)
+from lib.start_calendar_interval import StartCalendarInterval
+
+
+def log_line(time: str, message: str) -> str:
+    return f"[19/Oct/2026 {time}] INFO [root.run_phase:1] {message}\n"
+
+
+class HistoricalDurationsParserTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.log_directory = Path(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def parse(self, lines: List[str]) -> Dict[str, List[float]]:
+        self.log_directory.joinpath("duplicacy.log").write_text("".join(lines))
+        return HistoricalDurationsParser().parse(log_directory=self.log_directory)
+
+    def test_pairs_phase_start_and_result_by_action(self) -> None:
+        durations = self.parse(
+            [
+                log_line("01:00:00", "Pre-backup hooks started"),
+                log_line("01:00:00", "Running subprocess: ['/bin/sh', '-c', 'dump']"),
+                log_line("01:01:00", "Pre-backup hooks was successful"),
+                log_line("01:01:00", "Backup started"),
+                log_line(
+                    "01:01:00",
+                    "Running subprocess: ['duplicacy', '-log', 'backup', '-stats']",
+                ),
+                log_line("01:31:00", "Backup was successful"),
+                log_line("01:31:00", "Growth report started"),
+                log_line("01:32:00", "Growth report was successful"),
+                log_line("01:32:00", "Verification started"),
+                log_line("01:33:00", "Running subprocess: ['duplicacy', 'restore']"),
+                log_line("02:32:00", "Verification failed with exit code: 5"),
+                log_line("02:32:00", "Restore drill started"),
+                log_line("04:32:00", "Error in Restore drill: restore failed"),
+            ]
+        )
+
+        self.assertEqual(
+            {
+                "pre-backup hooks": [60.0],
+                "backup": [1800.0],
+                "growth report": [60.0],
+                "verification": [3600.0],
+                "restore drill": [7200.0],
+            },
+            durations,
+        )
+
+    def test_skips_cancelled_phases(self) -> None:
+        durations = self.parse(
+            [
+                log_line("01:00:00", "Backup started"),
+                log_line("01:10:00", "Backup was cancelled"),
+                log_line("02:00:00", "Prune started"),
+                log_line("02:05:00", "Prune was successful"),
+            ]
+        )
+
+        self.assertEqual({"prune": [300.0]}, durations)
+
+    def test_reads_logs_without_phase_start_lines(self) -> None:
+        durations = self.parse(
+            [
+                log_line(
+                    "01:00:00", "Running subprocess: ['duplicacy', '-log', 'check']"
+                ),
+                log_line("01:20:00", "Check was successful"),
+            ]
+        )
+
+        self.assertEqual({"check": [1200.0]}, durations)
+
+    def test_fails_without_logs(self) -> None:
+        with self.assertRaises(ScheduleSimulatorException):
+            HistoricalDurationsParser().parse(log_directory=self.log_directory)
+
+
+class ScheduleSimulatorTest(unittest.TestCase):
+    def test_coalesces_fires_during_a_run(self) -> None:
+        simulator = ScheduleSimulator(
+            intervals=[
+                StartCalendarInterval.from_csv("0,1,,,"),
+                StartCalendarInterval.from_csv("30,1,,,"),
+            ],
+            phase_samplers={"backup": lambda random: 45 * 60},
+            business_hours=range(9, 18),
+            business_weekdays=[1, 2, 3, 4, 5],
+        )
+
+        report = simulator.simulate(
+            start=datetime(2026, 10, 19), weeks=1, trials=2, random=Random(1)
+        )
+
+        # Each day the 1:30 fire waits for the 1:00 run and starts when it finishes at 1:45
+        self.assertEqual(14, report.fires_per_trial)
+        self.assertEqual(28, report.runs)
+        self.assertEqual(14, report.overlapping_fires)
+        self.assertEqual([15 * 60.0] * 14, report.queue_delays)
+        self.assertEqual(14, report.runs_running_at_next_fire)
+        self.assertEqual(0, report.runs_into_business_hours)
+
+    def test_coalesces_several_fires_into_one_pending_run(self) -> None:
+        simulator = ScheduleSimulator(
+            intervals=[StartCalendarInterval.from_csv("0,,,,")],
+            phase_samplers={"backup": lambda random: 150 * 60},
+            business_hours=range(9, 18),
+            business_weekdays=[],
+        )
+
+        report = simulator.simulate(
+            start=datetime(2026, 10, 19), weeks=1, trials=1, random=Random(1)
+        )
+
+        # Runs last 2.5 hours back to back, each taking over the fires queued during the last one
+        self.assertEqual(168, report.fires_per_trial)
+        self.assertEqual(167, report.overlapping_fires)
+        self.assertEqual(68, report.runs)
+        self.assertEqual(2.5 * 3600, max(report.queue_delays))
+
+    def test_is_reproducible_with_seed(self) -> None:
+        def simulate(seed: int) -> List[float]:
+            return (
+                ScheduleSimulator(
+                    intervals=[StartCalendarInterval.from_csv("0,1,,,")],
+                    phase_samplers={"backup": lognormal_sampler(3600, 1800)},
+                    business_hours=range(9, 18),
+                    business_weekdays=[1, 2, 3, 4, 5],
+                )
+                .simulate(
+                    start=datetime(2026, 10, 19), weeks=2, trials=3, random=Random(seed)
+                )
+                .durations
+            )
+
+        self.assertEqual(simulate(seed=7), simulate(seed=7))
+        self.assertNotEqual(simulate(seed=7), simulate(seed=8))
@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Dict, List
+from unittest import mock
+
+from run_backup import (
+    Commands,
+    DuplicacyStorage,
+    StorageProber,
+    StorageProbeResult,
+    storage_probe_host,
+)
+
+
+class StorageProberTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.storage_path = Path(self.directory.name)
+        self.prober = StorageProber(sample_bytes=4096, connect_timeout=1)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def probe(self, url: str) -> StorageProbeResult:
+        return self.prober.probe(DuplicacyStorage(name="default", url=url))
+
+    def test_measures_local_storage(self) -> None:
+        for url in [str(self.storage_path), f"file://{self.storage_path}"]:
+            result = self.probe(url)
+
+            self.assertTrue(result.reachable)
+            self.assertIsNotNone(result.latency)
+            self.assertGreater(result.write_throughput or 0, 0)
+            self.assertGreater(result.read_throughput or 0, 0)
+            self.assertEqual([], list(self.storage_path.iterdir()))
+
+    def test_reports_missing_local_storage_as_unreachable(self) -> None:
+        result = self.probe(str(self.storage_path.joinpath("missing")))
+
+        self.assertFalse(result.reachable)
+        self.assertIn("No such file or directory", result.error or "")
+
+    def test_connects_to_remote_storage(self) -> None:
+        with socket.create_server(("127.0.0.1", 0)) as server:
+            port = server.getsockname()[1]
+
+            result = self.probe(f"sftp://backup@127.0.0.1:{port}/storage")
+
+        self.assertTrue(result.reachable)
+        self.assertIsNotNone(result.latency)
+        self.assertIsNone(result.write_throughput)
+
+    def test_reports_refused_connection_as_unreachable(self) -> None:
+        with socket.create_server(("127.0.0.1", 0)) as server:
+            port = server.getsockname()[1]
+
+        result = self.probe(f"sftp://backup@127.0.0.1:{port}/storage")
+
+        self.assertFalse(result.reachable)
+
+    def test_leaves_storages_without_known_host_unprobed(self) -> None:
+        for url in ["hubic://backups", "swift://user@container", "s3c:///bucket"]:
+            self.assertIsNone(self.probe(url).reachable, url)
+
+
+class StorageProbeHostTest(unittest.TestCase):
+    def test_maps_storage_urls_to_hosts(self) -> None:
+        cases = {
+            ("b2", "bucket"): "api.backblazeb2.com",
+            ("gcs", "bucket"): "storage.googleapis.com",
+            ("azure", "account"): "account.blob.core.windows.net",
+            ("s3", "amazon.com"): "s3.amazonaws.com",
+            ("minio", "nas.local"): "nas.local",
+            ("sftp", "nas.local"): "nas.local",
+            ("hubic", "backups"): None,
+            ("s3", None): None,
+        }
+        for (scheme, hostname), host in cases.items():
+            self.assertEqual(host, storage_probe_host(scheme, hostname), scheme)
+
+
+class ProbeStorageTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.repository_path = Path(self.directory.name).joinpath("repository")
+        self.repository_path.joinpath(".duplicacy").mkdir(parents=True)
+        self.working_directory = os.getcwd()
+        os.chdir(self.repository_path)
+
+    def tearDown(self) -> None:
+        os.chdir(self.working_directory)
+        self.directory.cleanup()
+
+    def probe_storage(self, storages: Dict[str, str], mirrors: List[str]) -> bool:
+        self.repository_path.joinpath(".duplicacy", "preferences").write_text(
+            json.dumps(
+                [{"name": name, "storage": url} for name, url in storages.items()]
+            )
+        )
+        with mock.patch.dict(
+            os.environ,
+            {
+                "PROBE_STORAGE": "1",
+                "STORAGE_MIRRORS": " ".join(mirrors),
+                "SKIP_DISPLAY_ALERT": "1",
+            },
+        ):
+            return Commands(
+                logger=logging.getLogger("test"),
+                log_path=Path(self.directory.name).joinpath("duplicacy.log"),
+            ).probe_storage()
+
+    def local_storage(self, name: str) -> str:
+        path = Path(self.directory.name).joinpath(name)
+        path.mkdir()
+        return str(path)
+
+    def test_uses_reachable_mirror(self) -> None:
+        with self.assertLogs("test", level="INFO") as logs:
+            available = self.probe_storage(
+                storages={
+                    "default": "/missing/default",
+                    "nas": "/missing/nas",
+                    "disk": self.local_storage("disk"),
+                },
+                mirrors=["nas", "disk"],
+            )
+
+        self.assertTrue(available)
+        self.assertIn("INFO:test:Using the fastest mirror disk", logs.output)
+
+    def test_skips_run_when_every_mirror_is_unreachable(self) -> None:
+        with self.assertLogs("test", level="ERROR") as logs:
+            available = self.probe_storage(
+                storages={
+                    "default": self.local_storage("default"),
+                    "nas": "/missing/nas",
+                    "disk": "/missing/disk",
+                },
+                mirrors=["nas", "disk"],
+            )
+
+        self.assertFalse(available)
+        self.assertIn(
+            "ERROR:test:Backup skipped, storage is unreachable: nas, disk", logs.output
+        )
+
+    def test_checks_default_storage_without_mirrors(self) -> None:
+        self.assertFalse(
+            self.probe_storage(
+                storages={
+                    "offsite": self.local_storage("offsite"),
+                    "default": "/missing",
+                },
+                mirrors=[],
+            )
+        )
+        self.assertTrue(
+            self.probe_storage(storages={"offsite": "hubic://backups"}, mirrors=[])
+        )
+
+    def test_runs_when_probing_fails(self) -> None:
+        with mock.patch.object(
+            StorageProber, "probe", side_effect=PermissionError("denied")
+        ), self.assertLogs("test", level="ERROR") as logs:
+            available = self.probe_storage(storages={"default": "/missing"}, mirrors=[])
+
+        self.assertTrue(available)
+        self.assertIn("ERROR:test:Couldn't probe storage default: denied", logs.output)
@@ -0,0 +1,97 @@
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+
+from run_backup import SnapshotFile, VerificationCoverage, verification_batches
+
+
+def snapshot_files(sizes: List[int]) -> List[SnapshotFile]:
+    return [
+        SnapshotFile(path=f"file{index}", size=size, modified_at="2026-10-19")
+        for index, size in enumerate(sizes)
+    ]
+
+
+class VerificationCoverageTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.coverage = VerificationCoverage(
+            database_path=Path(self.directory.name).joinpath("coverage.sqlite3")
+        )
+
+    def tearDown(self) -> None:
+        self.coverage.close()
+        self.directory.cleanup()
+
+    def test_selects_within_byte_budget_and_file_limit(self) -> None:
+        self.coverage.load_listing(snapshot_files([10, 20, 300, 4000, 50000]))
+
+        selected = self.coverage.select(
+            byte_budget=1000, max_files=10, overdue_before=100
+        )
+
+        self.assertEqual(
+            ["file0", "file1", "file2"], sorted(file.path for file in selected)
+        )
+        self.assertEqual(
+            2,
+            len(
+                self.coverage.select(byte_budget=1000, max_files=2, overdue_before=100)
+            ),
+        )
+
+    def test_samples_across_size_buckets(self) -> None:
+        self.coverage.load_listing(snapshot_files([1] * 10 + [1000] * 10))
+
+        selected = self.coverage.select(
+            byte_budget=10**6, max_files=4, overdue_before=100
+        )
+
+        self.assertEqual([1, 1, 1000, 1000], sorted(file.size for file in selected))
+
+    def test_selects_overdue_files_first(self) -> None:
+        self.coverage.load_listing(snapshot_files([10, 10, 10, 10]))
+        self.coverage.mark_verified(["file0", "file1"], verified_at=200)
+        self.coverage.mark_verified(["file2"], verified_at=50)
+
+        selected = self.coverage.select(
+            byte_budget=20, max_files=10, overdue_before=100
+        )
+
+        self.assertEqual(["file2", "file3"], sorted(file.path for file in selected))
+
+    def test_fills_budget_with_recently_verified_files(self) -> None:
+        self.coverage.load_listing(snapshot_files([10, 10]))
+        self.coverage.mark_verified(["file0"], verified_at=200)
+
+        selected = self.coverage.select(
+            byte_budget=100, max_files=10, overdue_before=100
+        )
+
+        self.assertEqual(["file1", "file0"], [file.path for file in selected])
+
+    def test_drops_coverage_of_removed_files(self) -> None:
+        self.coverage.load_listing(snapshot_files([10, 10]))
+        self.coverage.mark_verified(["file0", "file1"], verified_at=200)
+        self.assertEqual(1.0, self.coverage.covered_fraction(verified_after=100))
+        self.coverage.close()
+
+        self.coverage = VerificationCoverage(
+            database_path=Path(self.directory.name).joinpath("coverage.sqlite3")
+        )
+        self.coverage.load_listing(snapshot_files([10, 10, 10])[1:])
+
+        self.assertEqual(0.5, self.coverage.covered_fraction(verified_after=100))
+
+
+class VerificationBatchesTest(unittest.TestCase):
+    def test_bounds_batches_by_files_and_bytes(self) -> None:
+        batches = verification_batches(
+            snapshot_files([10, 10, 100, 5, 5, 5]), max_files=2, max_bytes=20
+        )
+
+        self.assertEqual(
+            [[10, 10], [100], [5, 5], [5]],
+            [[file.size for file in batch] for batch in batches],
+        )